@@ -1,33 +1,207 @@
 
-from flask import Flask, request, jsonify, render_template
-import google.generativeai as genai
-from PIL import Image
+from flask import Flask, Response, g, request, jsonify, render_template
+from PIL import Image, ImageOps
 import io
 import base64
+import binascii
 import os
 import random
+import re
 import json
 import logging
-import math
-from gradio_client import Client
-import copy
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import hashlib
+import tempfile
+import threading
+import click
 
 from flask_cors import CORS
-from huggingface_hub import login
-login(token=os.environ.get("HF_TOKEN"))
+from werkzeug.exceptions import RequestEntityTooLarge
+from template_store import TemplateStore
+from template_registry import TemplateRegistry
+from template_schema import loads_lenient, repair_template, template_errors
+from template_model import ImageObject, Template
+from layout import solve_layout
+from palette import analysis_image, choose_text_color, extract_palette, region_luminance, required_contrast
+from renderer import OUTPUT_FORMATS, check_canvas_size, render_banner, render_many
+from jobs import JobQueue, QueueFullError
+from background_cache import BackgroundCache
+from blob_store import FileBlobStore, MemoryBlobStore, is_valid_asset_id, mime_type_for
+from uploads import UploadRequest
+from single_flight import SingleFlight
+from clients import clients
+from resilience import AdaptiveLimiter, AdmissionLimit, Backend, CircuitBreaker, CircuitOpenError, DeadlineExceeded, Overloaded
+from backgrounds import STYLES as BACKGROUND_STYLES, linear_gradient, render_background
+from metrics import SIZE_BUCKETS, Registry, RequestTrace, TraceBuffer
 
 
 app = Flask(__name__)
-logging.basicConfig(level=logging.DEBUG)
+# DEBUG also logs full Gemini responses; keep it for local debugging
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO").upper())
 
 # Enable CORS for all routes and origins
 CORS(app)
 
-# Configure Gemini API
-genai.configure(api_key=os.environ.get("GEMINI_API_KEY"))
+# Multipart uploads (/generate_banner/upload) are streamed into spooled temp files; a file or
+# request past these limits is rejected with 413 while it is still being received
+app.request_class = UploadRequest
+UploadRequest.max_file_bytes = int(os.environ.get("UPLOAD_MAX_FILE_BYTES", 10 * 1024 * 1024))
+UploadRequest.max_upload_bytes = int(os.environ.get("UPLOAD_MAX_TOTAL_BYTES", 40 * 1024 * 1024))
 
+# Identical generations (same text, palette, sizes and image contents) that arrive while one is
+# running share its result, which is also reused for COALESCE_RESULT_TTL seconds afterwards
+coalescer = None
+if os.environ.get("COALESCE_REQUESTS", "1") == "1":
+    coalescer = SingleFlight(result_ttl=float(os.environ.get("COALESCE_RESULT_TTL", 10)))
 
-flux_client = Client("black-forest-labs/FLUX.1-schnell", hf_token=os.environ.get("HF_TOKEN"))
+# Prometheus metrics served on /metrics. With TRACE_REQUESTS=1 every synchronous generation also
+# records a span per stage, and the last TRACE_BUFFER_SIZE traces are served on /traces.
+metrics = Registry()
+REQUEST_SECONDS = metrics.histogram("banner_http_request_seconds", "HTTP request latency", ["endpoint", "method", "status"])
+REQUEST_BYTES = metrics.histogram("banner_http_request_bytes", "HTTP request body size", ["endpoint"], SIZE_BUCKETS)
+RESPONSE_BYTES = metrics.histogram("banner_http_response_bytes", "HTTP response body size (non-streaming)", ["endpoint"], SIZE_BUCKETS)
+STAGE_SECONDS = metrics.histogram("banner_stage_seconds", "Wall time of each banner pipeline stage", ["stage"])
+BACKEND_SECONDS = metrics.histogram("banner_backend_call_seconds", "Flux and Gemini calls including retries, by outcome", ["backend", "outcome"])
+IMAGE_BYTES = metrics.histogram("banner_image_bytes", "Size of uploaded product images and backgrounds", ["kind"], SIZE_BUCKETS)
+TEMPLATE_SOURCES = metrics.counter("banner_template_source_total", "Where layouts came from: exact, store, scaled, gemini or solver", ["source"])
+BACKGROUND_SOURCES = metrics.counter("banner_background_source_total", "Where backgrounds came from", ["source"])
+GEMINI_TOKENS = metrics.counter("banner_gemini_tokens_total", "Gemini tokens reported in usage metadata", ["model", "kind"])
+TRACE_REQUESTS = os.environ.get("TRACE_REQUESTS", "0") == "1"
+trace_buffer = TraceBuffer(int(os.environ.get("TRACE_BUFFER_SIZE", 100)))
+# background_template_1360x800 -> background_template, so batch stages don't add a series per size
+RESOLUTION_SUFFIX = re.compile(r"_\d+x\d+$")
+BACKEND_OUTCOMES = {Overloaded: "overloaded", CircuitOpenError: "circuit_open", DeadlineExceeded: "timeout"}
+
+# Calls to Flux and Gemini go through a Backend each: a concurrency limit that adapts to latency,
+# a deadline across retries, jittered retries, optional hedging and a circuit breaker. Settings
+# are read from <PREFIX>_TIMEOUT, _RETRIES, _HEDGE_AFTER, _MAX_CONCURRENCY and _TARGET_LATENCY.
+def make_backend(name, prefix, timeout, retries, hedge_after, max_concurrency, target_latency):
+    env = lambda key, default: float(os.environ.get(f"{prefix}_{key}", default))
+    max_concurrency = int(env("MAX_CONCURRENCY", max_concurrency))
+    limiter = AdaptiveLimiter(
+        initial=max_concurrency,
+        min_limit=1,
+        max_limit=max_concurrency,
+        target_latency=env("TARGET_LATENCY", target_latency),
+        max_wait=float(os.environ.get("BACKEND_MAX_WAIT", 2)),
+    )
+    breaker = CircuitBreaker(
+        failure_threshold=int(os.environ.get("CIRCUIT_FAILURES", 5)),
+        reset_timeout=float(os.environ.get("CIRCUIT_RESET_SECONDS", 30)),
+    )
+    return Backend(name, limiter, breaker, timeout=env("TIMEOUT", timeout), retries=int(env("RETRIES", retries)),
+                   hedge_after=env("HEDGE_AFTER", hedge_after))
+
+# Hedging a Flux call doubles GPU work, so it is off unless FLUX_HEDGE_AFTER is set
+flux_backend = make_backend("flux", "FLUX", timeout=60, retries=1, hedge_after=0, max_concurrency=4, target_latency=20)
+gemini_backend = make_backend("gemini", "GEMINI", timeout=30, retries=2, hedge_after=8, max_concurrency=16, target_latency=6)
+
+# Synchronous generations beyond this many at once are answered with 503 right away instead of queueing
+generation_admission = AdmissionLimit(int(os.environ.get("MAX_CONCURRENT_GENERATIONS", 32)))
+
+# Where backgrounds come from, unless a request sets background_mode: "flux", a local style
+# (gradient, mesh, bokeh, noise), "local" for LOCAL_BACKGROUND_STYLE, or "auto", which draws locally
+# when Flux's observed latency (FLUX_EXPECTED_SECONDS until there is one) exceeds the latency budget
+BACKGROUND_MODE = os.environ.get("BACKGROUND_MODE", "flux")
+LOCAL_BACKGROUND_STYLE = os.environ.get("LOCAL_BACKGROUND_STYLE", "mesh")
+BACKGROUND_LATENCY_BUDGET_MS = float(os.environ.get("BACKGROUND_LATENCY_BUDGET_MS", 0))
+FLUX_EXPECTED_SECONDS = float(os.environ.get("FLUX_EXPECTED_SECONDS", 6))
+
+# Backgrounds drawn locally when Flux is unavailable and nothing suitable is cached
+FALLBACK_BACKGROUND_DIR = os.environ.get("FALLBACK_BACKGROUND_DIR", os.path.join(tempfile.gettempdir(), "banner-fallback-backgrounds"))
+
+# Flux and Gemini clients are created on first use (see clients.py); WARM_UP=1 creates them
+# in the background at startup instead, and /readyz reports 503 until that finishes
+WARM_UP = os.environ.get("WARM_UP", "0") == "1"
+warm_up_thread = None
+if WARM_UP:
+    warm_up_thread = threading.Thread(target=clients.warm_up, name="client-warm-up", daemon=True)
+    warm_up_thread.start()
+
+# Shared pool for the remote stages of generate_banner (template + background run side by side)
+stage_executor = ThreadPoolExecutor(max_workers=int(os.environ.get("STAGE_WORKERS", 8)), thread_name_prefix="banner-stage")
+
+# /generate_banners: max sizes per request and how many Flux backgrounds run at once
+BATCH_MAX_RESOLUTIONS = int(os.environ.get("BATCH_MAX_RESOLUTIONS", 8))
+BATCH_BACKGROUND_CONCURRENCY = int(os.environ.get("BATCH_BACKGROUND_CONCURRENCY", 3))
+
+# Asynchronous mode (?async=1): bounded worker pool, queue depth limit and result retention (seconds)
+job_queue = JobQueue(
+    max_workers=int(os.environ.get("JOB_WORKERS", 4)),
+    max_pending=int(os.environ.get("JOB_MAX_PENDING", 32)),
+    result_ttl=int(os.environ.get("JOB_RESULT_TTL", 600)),
+)
+
+# Optional disk cache of Flux backgrounds (enabled by BACKGROUND_CACHE_DIR). Each theme/palette/size
+# has a pool of BACKGROUND_SEED_POOL seeds, so cached backgrounds still vary between requests.
+FLUX_INFERENCE_STEPS = 4
+background_cache = None
+if os.environ.get("BACKGROUND_CACHE_DIR"):
+    background_cache = BackgroundCache(
+        os.environ["BACKGROUND_CACHE_DIR"],
+        max_bytes=int(os.environ.get("BACKGROUND_CACHE_MAX_BYTES", 1024 * 1024 * 1024)),
+        seed_pool_size=int(os.environ.get("BACKGROUND_SEED_POOL", 4)),
+    )
+
+# Output encoding of the background: "original" keeps the Flux file as-is, "webp"/"jpeg"/"png" re-encode it.
+# Checked here so a typo fails at startup rather than in every request's background stage.
+BACKGROUND_FORMATS = ("original", "webp", "jpeg", "png")
+BACKGROUND_FORMAT = (os.environ.get("BACKGROUND_FORMAT") or "original").lower()
+if BACKGROUND_FORMAT == "jpg":
+    BACKGROUND_FORMAT = "jpeg"
+if BACKGROUND_FORMAT not in BACKGROUND_FORMATS:
+    raise ValueError(f"BACKGROUND_FORMAT must be one of {', '.join(BACKGROUND_FORMATS)}, got {BACKGROUND_FORMAT!r}")
+BACKGROUND_QUALITY = int(os.environ.get("BACKGROUND_QUALITY", 85))
+
+# Longest edge (px) of the thumbnails sent to the Gemini design call; originals still go into the template
+VISION_MAX_EDGE = int(os.environ.get("VISION_MAX_EDGE", 512))
+
+# Uploaded images are decoded concurrently on this pool. Only these formats are opened, and images
+# above IMAGE_MAX_PIXELS are rejected from their header before any pixel data is decoded.
+decode_executor = ThreadPoolExecutor(max_workers=int(os.environ.get("DECODE_WORKERS", 4)), thread_name_prefix="image-decode")
+IMAGE_FORMATS = ("PNG", "JPEG", "WEBP", "GIF", "BMP")
+IMAGE_MAX_PIXELS = int(os.environ.get("IMAGE_MAX_PIXELS", 40_000_000))
+
+# Images are served from a content-addressed store at ASSET_URL_PREFIX<id> instead of being inlined
+# as data URLs (set INLINE_ASSETS=1 for the old behaviour). ASSET_STORE_DIR keeps them on disk.
+INLINE_ASSETS = os.environ.get("INLINE_ASSETS", "0") == "1"
+ASSET_URL_PREFIX = os.environ.get("ASSET_URL_PREFIX", "/assets/")
+if os.environ.get("ASSET_STORE_DIR"):
+    blob_store = FileBlobStore(os.environ["ASSET_STORE_DIR"])
+else:
+    blob_store = MemoryBlobStore(max_bytes=int(os.environ.get("ASSET_STORE_MAX_BYTES", 256 * 1024 * 1024)))
+
+# How layouts are produced when no stored template fits: "solver" computes one locally from the
+# actual image shapes (layout.py), "gemini" asks the LLM with generate_template_with_gemini
+TEMPLATE_GENERATOR = os.environ.get("TEMPLATE_GENERATOR", "solver")
+
+# "local" computes background and text colors from the background pixels (palette.py) with a WCAG
+# contrast check; "gemini" uses the colors returned by the design call as-is
+TEXT_COLOR_MODE = os.environ.get("TEXT_COLOR_MODE", "local")
+
+# Number of stored templates used as few-shot examples when generating a layout with Gemini
+TEMPLATE_PROMPT_EXAMPLES = int(os.environ.get("TEMPLATE_PROMPT_EXAMPLES", 4))
+
+# Layouts generated by Gemini are reused across requests (and restarts when TEMPLATE_STORE_PATH is set)
+template_store = TemplateStore(
+    max_entries=int(os.environ.get("TEMPLATE_STORE_SIZE", 256)),
+    path=os.environ.get("TEMPLATE_STORE_PATH"),
+)
+
+def cache_lookups():
+    lookups = {("template_store", "hit"): template_store.hits, ("template_store", "miss"): template_store.misses}
+    if background_cache is not None:
+        lookups.update({("background", "hit"): background_cache.hits, ("background", "miss"): background_cache.misses})
+    if coalescer is not None:
+        lookups.update({("coalescer", "hit"): coalescer.shared, ("coalescer", "miss"): coalescer.executed})
+    return lookups
+
+metrics.callback("banner_cache_lookups_total", "Cache lookups by result; the hit ratio is hit / (hit + miss)", "counter", ["cache", "result"], cache_lookups)
+metrics.callback("banner_backend_concurrency_limit", "Current adaptive concurrency limit per backend", "gauge", ["backend"],
+                 lambda: {("flux",): int(flux_backend.limiter.limit), ("gemini",): int(gemini_backend.limiter.limit)})
+metrics.callback("banner_jobs_pending", "Async jobs queued or running", "gauge", [], lambda: {(): job_queue.pending})
 
 
 
@@ -267,166 +441,453 @@ TEMPLATES = [
     } 
 ]
 
+# Exact (resolution, num_images) lookups plus nearest-aspect scaling over TEMPLATES, parsed once at startup
+template_registry = TemplateRegistry([Template.from_dict(template) for template in TEMPLATES], aspect_tolerance=float(os.environ.get("TEMPLATE_SCALE_TOLERANCE", 0.1)))
 
 
 
-def generate_background(theme, color_palette, canvasWidth, canvasHeight):
+def generate_background(theme, color_palette, canvasWidth, canvasHeight, seed=None):
+    """
+    Returns (image bytes, seed) for a Flux background. With the background cache enabled the seed
+    comes from the cache's per-prompt pool (unless given) and cached images are reused.
+    """
     colors = ",".join(color_palette)
     prompt = f"abstract background image banner, background theme: {theme}, background colors: {colors}"
-    print(f"Generating background image for: {prompt}")
-    # flux_client = Client("black-forest-labs/FLUX.1-schnell")
-    result = flux_client.predict(
-        prompt=prompt,
-        seed=0,
-        randomize_seed=True,
-        width=canvasWidth,
-        height=canvasHeight,
-        num_inference_steps=4,
-        api_name="/infer"
-    )
-    return result
 
-def image_to_base64(image_path):
-    with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode('utf-8')
-
-
-def round_percentages(template):
-    for obj in template['objects']:
-        # Update 'left', 'top', 'width', 'height' values
-        for key in ['left', 'bottom', 'width', 'height']:
-            if key in obj:
-                value = obj[key]
-                if isinstance(value, str) and value.endswith('%'):
-                    numeric_value = float(value.strip('%'))
-                    rounded_value = math.ceil(numeric_value)
-                    obj[key] = f"{rounded_value}%"
-                elif isinstance(value, (int, float)):
-                    # Assuming the value is in percentage and needs rounding
-                    rounded_value = math.ceil(value)
-                    obj[key] = f"{rounded_value}%"
-    return template
+    cache_key = None
+    if background_cache is not None:
+        if seed is None:
+            seed = background_cache.pick_seed(prompt, canvasWidth, canvasHeight, FLUX_INFERENCE_STEPS)
+        cache_key = background_cache.key(prompt, canvasWidth, canvasHeight, FLUX_INFERENCE_STEPS, seed)
+        cached = background_cache.get(cache_key)
+        if cached is not None:
+            BACKGROUND_SOURCES.inc(source="cache")
+            return cached, seed
+
+    logging.info(f"Generating background image for: {prompt}")
+    try:
+        result = call_backend(
+            flux_backend,
+            flux_predict,
+            prompt=prompt,
+            seed=seed or 0,
+            randomize_seed=seed is None,
+            width=canvasWidth,
+            height=canvasHeight,
+            num_inference_steps=FLUX_INFERENCE_STEPS,
+            api_name="/infer"
+        )
+    except Exception as e:
+        logging.warning(f"Flux unavailable ({type(e).__name__}: {str(e)}), using a fallback background")
+        return fallback_background(prompt, color_palette, canvasWidth, canvasHeight)
+    BACKGROUND_SOURCES.inc(source="flux")
+    if cache_key is not None:
+        return background_cache.put(cache_key, result[0]), seed
+    with open(result[0], "rb") as image_file:
+        return image_file.read(), result[1]
+
+def flux_predict(**kwargs):
+    return clients.get("flux").predict(**kwargs)
+
+def call_backend(backend, func, *args, **kwargs):
+    """backend.call with its duration recorded by outcome (ok, overloaded, circuit_open, timeout or error)."""
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        return backend.call(func, *args, **kwargs)
+    except Exception as e:
+        outcome = BACKEND_OUTCOMES.get(type(e), "error")
+        raise
+    finally:
+        BACKEND_SECONDS.observe(time.perf_counter() - start, backend=backend.name, outcome=outcome)
+
+def fallback_background(prompt, color_palette, width, height):
+    """
+    (image bytes, seed) of a background that needs no Flux call: any cached background for the
+    prompt and size, otherwise a gradient of the palette drawn locally (and kept for reuse on disk).
+    """
+    if background_cache is not None:
+        cached = background_cache.any_cached(prompt, width, height, FLUX_INFERENCE_STEPS)
+        if cached is not None:
+            BACKGROUND_SOURCES.inc(source="fallback_cache")
+            return cached
+    BACKGROUND_SOURCES.inc(source="fallback_local")
+    colors = [color for color in color_palette if HEX_COLOR.match(color)]
+    name = hashlib.sha256(f"{','.join(colors)}|{width}x{height}".encode()).hexdigest()[:32]
+    path = os.path.join(FALLBACK_BACKGROUND_DIR, f"{name}.png")
+    if not os.path.exists(path):
+        os.makedirs(FALLBACK_BACKGROUND_DIR, exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        linear_gradient(colors, width, height).save(tmp_path, format="PNG")
+        os.replace(tmp_path, path)
+    with open(path, "rb") as image_file:
+        return image_file.read(), None
+
+def warm_background_cache(theme, color_palette, resolutions):
+    """Generates every seed of the pool for each resolution so later requests for the campaign hit the cache."""
+    if background_cache is None:
+        raise RuntimeError("BACKGROUND_CACHE_DIR is not set")
+    for resolution in resolutions:
+        width, height = map(int, resolution.split('x'))
+        colors = ",".join(color_palette)
+        prompt = f"abstract background image banner, background theme: {theme}, background colors: {colors}"
+        for seed in background_cache.seed_pool(prompt, width, height, FLUX_INFERENCE_STEPS):
+            generate_background(theme, color_palette, width, height, seed=seed)
+
+class InvalidRequest(ValueError):
+    """
+    Raised for client input the service can't use (a bad image, resolution or background mode);
+    the endpoints answer it with 400. Other errors, e.g. unusable model output, stay 500s.
+    """
+
+def read_image_data(image_data):
+    """
+    Raw bytes of an uploaded image, given as a data URL or bare base64 string (JSON requests),
+    as bytes, or as an uploaded file (multipart requests).
+    """
+    if isinstance(image_data, str):
+        if image_data.startswith("data:"):
+            image_data = image_data.split(",", 1)[1]
+        try:
+            return base64.b64decode(image_data)
+        except binascii.Error:
+            raise InvalidRequest("Image is not valid base64")
+    if isinstance(image_data, bytes):
+        return image_data
+    return image_data.read()
+
+def decode_image_data(image_data):
+    """
+    Opens an uploaded image after checking its format and dimensions from the header.
+    Returns (raw bytes, opened PIL image); raises InvalidRequest for anything that isn't a usable image.
+    """
+    image_bytes = read_image_data(image_data)
+    try:
+        image = Image.open(io.BytesIO(image_bytes), formats=IMAGE_FORMATS)
+    except OSError:
+        raise InvalidRequest(f"Unsupported image, expected one of {', '.join(IMAGE_FORMATS)}")
+    if image.width * image.height > IMAGE_MAX_PIXELS:
+        raise InvalidRequest(f"Image of {image.width}x{image.height} exceeds {IMAGE_MAX_PIXELS} pixels")
+    return image_bytes, image
+
+def asset_src(data, mime_type):
+    """Returns the src for an image in the template: an /assets URL, or a data URL with INLINE_ASSETS."""
+    if INLINE_ASSETS:
+        return f"data:{mime_type};base64,{base64.b64encode(data).decode('ascii')}"
+    return ASSET_URL_PREFIX + blob_store.put(data, mime_type)
+
+def image_src(image_bytes, image):
+    return asset_src(image_bytes, Image.MIME.get(image.format, "image/jpeg"))
+
+def make_vision_thumbnail(image, max_edge=None):
+    """
+    Returns an orientation-corrected copy of `image` no larger than max_edge on its longest
+    side. Gemini only needs colors and product names from these, not full resolution.
+    """
+    max_edge = max_edge or VISION_MAX_EDGE
+    # For JPEGs this lets the decoder downscale while decoding instead of after
+    image.draft("RGB", (max_edge, max_edge))
+    thumbnail = ImageOps.exif_transpose(image)
+    if thumbnail is image:
+        thumbnail = image.copy()
+    thumbnail.thumbnail((max_edge, max_edge), Image.LANCZOS)
+    return thumbnail
+
+def check_resolution(resolution):
+    """
+    Raises InvalidRequest unless resolution is "WIDTHxHEIGHT" within MAX_CANVAS_PIXELS, since
+    local and fallback backgrounds are drawn at the full requested size.
+    """
+    try:
+        width, height = map(int, str(resolution).split('x'))
+    except ValueError:
+        raise InvalidRequest(f"Invalid resolution {resolution!r}, expected e.g. '1360x800'")
+    try:
+        check_canvas_size(width, height)
+    except ValueError as e:
+        raise InvalidRequest(str(e))
+
+def choose_background_style(mode=None, latency_budget_ms=None):
+    """
+    Resolves a request's background_mode (default BACKGROUND_MODE) to a local background style,
+    or None for Flux. With "auto", Flux is skipped when its circuit is open or when its expected
+    latency exceeds latency_budget_ms (default BACKGROUND_LATENCY_BUDGET_MS; 0 means no budget).
+    """
+    mode = str(mode or BACKGROUND_MODE).lower()
+    if mode in BACKGROUND_STYLES:
+        return mode
+    if mode == "local":
+        return LOCAL_BACKGROUND_STYLE
+    if mode == "auto":
+        try:
+            budget = float(latency_budget_ms or BACKGROUND_LATENCY_BUDGET_MS)
+        except (TypeError, ValueError):
+            raise InvalidRequest(f"Invalid latency_budget_ms {latency_budget_ms!r}")
+        expected_ms = (flux_backend.latency or FLUX_EXPECTED_SECONDS) * 1000
+        if flux_backend.breaker.state == "open" or (budget and expected_ms > budget):
+            return LOCAL_BACKGROUND_STYLE
+        return None
+    if mode == "flux":
+        return None
+    raise InvalidRequest(f"Unknown background_mode {mode!r}, expected flux, local, auto or one of {', '.join(BACKGROUND_STYLES)}")
+
+def make_background(theme, color_palette, width, height, background_style=None):
+    """
+    Returns (raw bytes, opened PIL image) of the background: drawn locally in background_style
+    (backgrounds.py, tens of milliseconds) when one is given, otherwise generated by Flux.
+    """
+    if background_style is None:
+        image_bytes, background_image = open_background(generate_background(theme, color_palette, width, height)[0])
+        IMAGE_BYTES.observe(len(image_bytes), kind="background")
+        return image_bytes, background_image
+    colors = [color for color in color_palette if HEX_COLOR.match(color)]
+    image = render_background(background_style, colors, width, height, seed=random.randrange(2 ** 32))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=BACKGROUND_QUALITY)
+    image_bytes = buffer.getvalue()
+    background_image = Image.open(io.BytesIO(image_bytes))
+    background_image.load()
+    BACKGROUND_SOURCES.inc(source="local")
+    IMAGE_BYTES.observe(len(image_bytes), kind="background")
+    return image_bytes, background_image
+
+def open_background(image_bytes):
+    """Decodes the generated background; returns (raw bytes, opened PIL image)."""
+    image = Image.open(io.BytesIO(image_bytes))
+    image.load()
+    return image_bytes, image
+
+def encode_background(image_bytes, image, image_format=None, quality=None):
+    """
+    Returns (bytes, mime type) of the background for the response. With BACKGROUND_FORMAT
+    set to "webp", "jpeg" or "png" the image is re-encoded at BACKGROUND_QUALITY first, otherwise
+    the original bytes are used as-is with their real mime type.
+    """
+    image_format = (image_format or BACKGROUND_FORMAT).lower()
+    quality = quality or BACKGROUND_QUALITY
+    if image_format == "jpg":
+        image_format = "jpeg"
+    source_format = (image.format or "PNG").lower()
+    if image_format == "original" or image_format == source_format:
+        mime_type = Image.MIME.get(source_format.upper(), "image/png")
+        payload = image_bytes
+    else:
+        buffer = io.BytesIO()
+        converted = image.convert("RGB") if image_format == "jpeg" else image
+        converted.save(buffer, format=image_format.upper(), quality=quality)
+        mime_type = f"image/{image_format}"
+        payload = buffer.getvalue()
+    return payload, mime_type
+
+def background_src(image_bytes, image):
+    return asset_src(*encode_background(image_bytes, image))
+
+
+def build_template_prompt(resolution, num_images):
+    """
+    Few-shot prompt for a layout: only the TEMPLATE_PROMPT_EXAMPLES stored templates closest to
+    the request (by image count and aspect ratio), serialized compactly.
+    """
+    parts = ["For given resolution and number of images, generate fabricjs object template that positions the image and text objects as per resolution in JSON fomat: (Return JSON only)"]
+    for example in template_registry.nearest_k(resolution, num_images, TEMPLATE_PROMPT_EXAMPLES):
+        parts.append(f"input: - resolution: {example.resolution}\n- num_images: {example.num_images}")
+        parts.append("output: " + json.dumps(example.to_dict(), separators=(',', ':')))
+    parts.append(f"input: - resolution: {resolution}\n- num_images: {num_images}")
+    parts.append("output: ")
+    return parts
+
+def parse_template_response(response_text, resolution, num_images):
+    """Parses and, if needed, locally repairs a generated template. Returns (template, errors)."""
+    try:
+        template = loads_lenient(response_text)
+    except json.JSONDecodeError as e:
+        return None, [f"output is not valid JSON: {str(e)}"]
+    errors = template_errors(template, num_images)
+    if errors:
+        template = repair_template(template, resolution, num_images)
+        errors = template_errors(template, num_images)
+    return template, errors
+
+def gemini_generate(model_name, contents, generation_config=None):
+    response = clients.gemini_model(model_name, generation_config).generate_content(contents)
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None:
+        GEMINI_TOKENS.inc(getattr(usage, "prompt_token_count", 0) or 0, model=model_name, kind="prompt")
+        GEMINI_TOKENS.inc(getattr(usage, "candidates_token_count", 0) or 0, model=model_name, kind="output")
+    return response
 
 def generate_template_with_gemini(resolution, num_images):
+    """
+    Generates a layout with Gemini in JSON response mode. Output that fails validation is
+    repaired locally and, failing that, sent back once with the errors for correction.
+    Returns the parsed Template, or None when no valid template comes out, so the caller can
+    fall back to the solver.
+    """
     generation_config = {
     "temperature": 1,
     "top_p": 0.95,
     "top_k": 64,
-    "max_output_tokens": 8192,
-    "response_mime_type": "text/plain",
+    "max_output_tokens": 2048,
+    "response_mime_type": "application/json",
     }
 
-    model = genai.GenerativeModel(
-    model_name="gemini-1.5-flash",
-    generation_config=generation_config,
-    )
-
     # structured prompt with few shot prompting
-    response = model.generate_content([
-    "For given resolution and number of images, generate fabricjs object template that positions the image and text objects as per resolution in JSON fomat: (Return JSON only)",
-    "input: - resolution: 1360x800\n- num_images: 1",
-    "output: {        \"resolution\": \"1360x800\",        \"num_images\": 1,            \"objects\": [        {\"type\":\"text\",\"left\":\"7.86%\",\"bottom\":\"49.62%\",\"width\":\"48%\",\"height\":\"100%\",\"fontSize\":48,\"fill\":\"\",\"fontWeight\":\"bold\",\"fontStyle\":\"\",\"textAlign\":\"left\",\"text\":\"\",\"fontFamily\":\"Gill Sans MT\"},        {\"type\":\"text\",\"left\":\"7.44%\",\"bottom\":\"36.78%\",\"width\":\"48%\",\"height\":\"100%\",\"fontSize\":64,\"fill\":\"\",\"fontWeight\":\"bold\",\"fontStyle\":\"normal\",\"textAlign\":\"left\",\"text\":\"\",\"fontFamily\":\"Arial Black\"},        {\"type\":\"image\",\"left\":\"62%\",\"bottom\":\"7%\",\"width\":\"70%\",\"height\":\"70%\",\"src\":\"\"},        ]    }",
-    "input: - resolution: 1360x800\n- num_images: 1",
-    "output: {        \"resolution\": \"1360x800\",        \"num_images\": 1,        \"objects\": [            {\"type\":\"text\",\"left\":\"7.52%\",\"bottom\":\"49.90%\",\"width\":\"48.99%\",\"height\":\"100%\",\"fontSize\":48,\"fill\":\"\",\"fontWeight\":\"bold\",\"fontStyle\":\"\",\"textAlign\":\"left\",\"text\":\"\",\"fontFamily\":\"Gill Sans MT\"},            {\"type\":\"text\",\"left\":\"7.02%\",\"bottom\":\"38.15%\",\"width\":\"48.00%\",\"height\":\"100%\",\"fontSize\":64,\"fill\":\"\",\"fontWeight\":\"bold\",\"fontStyle\":\"normal\",\"textAlign\":\"left\",\"text\":\"\",\"fontFamily\":\"Arial Black\"},            {\"type\":\"image\",\"left\":\"70.34%\",\"bottom\":\"8.05%\",\"width\":\"70%\",\"height\":\"70%\",\"src\":\"\"}        ]    }",
-    "input: - resolution: 1360x800\n- num_images: 2",
-    "output: {        \"resolution\": \"1360x800\",        \"num_images\": 2,            \"objects\": [            {\"type\":\"text\",\"left\":\"6.00%\",\"bottom\":\"49.55%\",\"width\":\"44.23%\",\"height\":\"100%\",\"fontSize\":50,\"fill\":\"\",\"fontWeight\":\"bold\",\"fontStyle\":\"\",\"textAlign\":\"left\",\"text\":\"\",\"fontFamily\":\"Trebuchet MS\"},            {\"type\":\"text\",\"left\":\"6.00%\",\"bottom\":\"33.03%\",\"width\":\"43.91%\",\"height\":\"100%\",\"fontSize\":60,\"fill\":\"\",\"fontWeight\":\"bold\",\"fontStyle\":\"normal\",\"textAlign\":\"left\",\"text\":\"\",\"fontFamily\":\"Verdana\"},            {\"type\":\"image\",\"left\":\"60.42%\",\"bottom\":\"15.57%\",\"width\":\"50%\",\"height\":\"50%\",\"src\":\"\"},            {\"type\":\"image\",\"left\":\"70.42%\",\"bottom\":\"15.46%\",\"width\":\"50%\",\"height\":\"50%\",\"src\":\"\"},        ]    }",
-    "input: - resolution: 1360x800\n- num_images: 3",
-    "output: {        \"resolution\": \"1360x800\",        \"num_images\": 3,            \"objects\": [            {\"type\":\"text\",\"left\":\"7.52%\",\"bottom\":\"49.90%\",\"width\":\"48.99%\",\"height\":\"100%\",\"fontSize\":48,\"fill\":\"\",\"fontWeight\":\"bold\",\"fontStyle\":\"\",\"textAlign\":\"left\",\"text\":\"\",\"fontFamily\":\"Gill Sans MT\"},            {\"type\":\"text\",\"left\":\"7.02%\",\"bottom\":\"38.15%\",\"width\":\"48.00%\",\"height\":\"100%\",\"fontSize\":64,\"fill\":\"\",\"fontWeight\":\"bold\",\"fontStyle\":\"normal\",\"textAlign\":\"left\",\"text\":\"\",\"fontFamily\":\"Arial Black\"},            {\"type\":\"image\",\"left\":\"60.42%\",\"bottom\":\"15.57%\",\"width\":\"50%\",\"height\":\"50%\",\"src\":\"\"},            {\"type\":\"image\",\"left\":\"70.42%\",\"bottom\":\"15.46%\",\"width\":\"50%\",\"height\":\"50%\",\"src\":\"\"},            {\"type\":\"image\",\"left\":\"82.47%\",\"bottom\":\"16.39%\",\"width\":\"50%\",\"height\":\"50%\",\"src\":\"\"}        ]    }",
-    "input: - resolution: 1360x800\n- num_images: 3",
-    "output: {        \"resolution\": \"1360x800\",        \"num_images\": 3,        \"objects\": [            {\"type\":\"text\",\"left\":\"31.37%\",\"bottom\":\"84.04%\",\"width\":\"48.00%\",\"height\":\"100%\",\"fontSize\":48,\"fill\":\"\",\"fontWeight\":\"bold\",\"fontStyle\":\"\",\"textAlign\":\"left\",\"text\":\"\",\"fontFamily\":\"Gill Sans MT\"},            {\"type\":\"text\",\"left\":\"29.13%\",\"bottom\":\"71.90%\",\"width\":\"48.00%\",\"height\":\"100%\",\"fontSize\":64,\"fill\":\"\",\"fontWeight\":\"bold\",\"fontStyle\":\"normal\",\"textAlign\":\"left\",\"text\":\"\",\"fontFamily\":\"Arial Black\"},            {\"type\":\"image\",\"left\":\"49.25%\",\"bottom\":\"10.10%\",\"width\":\"50%\",\"height\":\"50%\",\"src\":\"\"},            {\"type\":\"image\",\"left\":\"29.50%\",\"bottom\":\"9.82%\",\"width\":\"50%\",\"height\":\"50%\",\"src\":\"\"},            {\"type\":\"image\",\"left\":\"40.88%\",\"bottom\":\"10.80%\",\"width\":\"50%\",\"height\":\"50%\",\"src\":\"\"}        ]    }",
-    "input: - resolution: 1360x800\n- num_images: 3",
-    "output: {        \"resolution\": \"1360x800\",        \"num_images\": 5,        \"objects\": [            {\"type\":\"text\",\"left\":\"28.50%\",\"bottom\":\"83.55%\",\"width\":\"48.00%\",\"height\":\"100%\",\"fontSize\":48,\"fill\":\"\",\"fontWeight\":\"bold\",\"fontStyle\":\"\",\"textAlign\":\"left\",\"text\":\"\",\"fontFamily\":\"Gill Sans MT\"},            {\"type\":\"text\",\"left\":\"30.00%\",\"bottom\":\"70.96%\",\"width\":\"48.00%\",\"height\":\"100%\",\"fontSize\":64,\"fill\":\"\",\"fontWeight\":\"bold\",\"fontStyle\":\"normal\",\"textAlign\":\"left\",\"text\":\"\",\"fontFamily\":\"Arial Black\"},            {\"type\":\"image\",\"left\":\"23.00%\",\"bottom\":\"10.00%\",\"width\":\"50%\",\"height\":\"50%\",\"src\":\"\"},            {\"type\":\"image\",\"left\":\"33.00%\",\"bottom\":\"10.00%\",\"width\":\"50%\",\"height\":\"50%\",\"src\":\"\"},            {\"type\":\"image\",\"left\":\"55.25%\",\"bottom\":\"10.43%\",\"width\":\"50%\",\"height\":\"50%\",\"src\":\"\"},            {\"type\":\"image\",\"left\":\"44.00%\",\"bottom\":\"10.00%\",\"width\":\"50%\",\"height\":\"50%\",\"src\":\"\"},            {\"type\":\"image\",\"left\":\"51.50%\",\"bottom\":\"9.20%\",\"width\":\"50%\",\"height\":\"50%\",\"src\":\"\"}        ]    }",
-    "input: - resolution: 1360x800\n- num_images: 4",
-    "output: {        \"resolution\": \"1360x800\",        \"num_images\": 4,        \"objects\": [            {\"type\":\"text\",\"left\":\"22.25%\",\"bottom\":\"83.22%\",\"width\":\"59.78%\",\"height\":\"100%\",\"fontSize\":48,\"fill\":\"\",\"fontWeight\":\"bold\",\"fontStyle\":\"\",\"textAlign\":\"left\",\"text\":\"\",\"fontFamily\":\"Gill Sans MT\"},            {\"type\":\"text\",\"left\":\"25.50%\",\"bottom\":\"73.21%\",\"width\":\"51.03%\",\"height\":\"100%\",\"fontSize\":64,\"fill\":\"\",\"fontWeight\":\"bold\",\"fontStyle\":\"normal\",\"textAlign\":\"left\",\"text\":\"\",\"fontFamily\":\"Arial Black\"},            {\"type\":\"image\",\"left\":\"48.00%\",\"bottom\":\"4.16%\",\"width\":\"50%\",\"height\":\"50%\",\"src\":\"\"},            {\"type\":\"image\",\"left\":\"28.00%\",\"bottom\":\"4.16%\",\"width\":\"50%\",\"height\":\"50%\",\"src\":\"\"},            {\"type\":\"image\",\"left\":\"58.00%\",\"bottom\":\"4.16%\",\"width\":\"50%\",\"height\":\"50%\",\"src\":\"\"},            {\"type\":\"image\",\"left\":\"38.00%\",\"bottom\":\"4.16%\",\"width\":\"50%\",\"height\":\"50%\",\"src\":\"\"}        ]    }",
-    "input: - resolution: 1360x800\n- num_images: 6",
-    "output: {\n    \"resolution\": \"1360x800\",\n    \"num_images\": 6,\n    \"objects\": [\n        {\"type\":\"text\",\"left\":\"24.25%\",\"bottom\":\"79.97%\",\"width\":\"55.63%\",\"height\":\"100%\",\"fontSize\":48,\"fill\":\"\",\"fontWeight\":\"bold\",\"fontStyle\":\"\",\"textAlign\":\"left\",\"text\":\"\",\"fontFamily\":\"Segoe Print\"},\n        {\"type\":\"text\",\"left\":\"25.87%\",\"bottom\":\"69.94%\",\"width\":\"50.28%\",\"height\":\"100%\",\"fontSize\":64,\"fill\":\"\",\"fontWeight\":\"bold\",\"fontStyle\":\"normal\",\"textAlign\":\"left\",\"text\":\"\",\"fontFamily\":\"Arial Black\"},\n        {\"type\":\"image\",\"left\":\"20.88%\",\"bottom\":\"6.00%\",\"width\":\"50%\",\"height\":\"50%\",\"src\":\"\"},\n        {\"type\":\"image\",\"left\":\"30.87%\",\"bottom\":\"6.00%\",\"width\":\"50%\",\"height\":\"50%\",\"src\":\"\"},\n        {\"type\":\"image\",\"left\":\"39.88%\",\"bottom\":\"6.45%\",\"width\":\"50%\",\"height\":\"50%\",\"src\":\"\"},\n        {\"type\":\"image\",\"left\":\"50.88%\",\"bottom\":\"6.00%\",\"width\":\"50%\",\"height\":\"50%\",\"src\":\"\"},\n        {\"type\":\"image\",\"left\":\"61.63%\",\"bottom\":\"6.45%\",\"width\":\"50%\",\"height\":\"50%\",\"src\":\"\"},\n        {\"type\":\"image\",\"left\":\"66.00%\",\"bottom\":\"5.84%\",\"width\":\"50%\",\"height\":\"50%\",\"src\":\"\"}\n    ]\n}",
-    "input: - resolution: 1920x600\n- num_images: 6",
-    "output: {        \"resolution\": \"1920x600\",        \"num_images\": 6,        \"objects\": [            {\"type\":\"text\",\"left\":\"32.49%\",\"bottom\":\"83.35%\",\"width\":\"58.46%\",\"height\":\"100%\",\"fontSize\":30,\"fill\":\"\",\"fontWeight\":\"bold\",\"fontStyle\":\"\",\"textAlign\":\"left\",\"text\":\"\",\"fontFamily\":\"Segoe Print\"},            {\"type\":\"text\",\"left\":\"35.13%\",\"bottom\":\"73.31%\",\"width\":\"53.78%\",\"height\":\"100%\",\"fontSize\":48,\"fill\":\"\",\"fontWeight\":\"bold\",\"fontStyle\":\"normal\",\"textAlign\":\"left\",\"text\":\"\",\"fontFamily\":\"Arial Black\"},            {\"type\":\"image\",\"left\":\"30.69%\",\"bottom\":\"7.00%\",\"width\":\"35%\",\"height\":\"35%\",\"src\":\"\"},            {\"type\":\"image\",\"left\":\"36.69%\",\"bottom\":\"7.00%\",\"width\":\"35%\",\"height\":\"35%\",\"src\":\"\"},            {\"type\":\"image\",\"left\":\"42.69%\",\"bottom\":\"7.45%\",\"width\":\"35%\",\"height\":\"35%\",\"src\":\"\"},            {\"type\":\"image\",\"left\":\"48.69%\",\"bottom\":\"7.00%\",\"width\":\"35%\",\"height\":\"35%\",\"src\":\"\"},            {\"type\":\"image\",\"left\":\"54.44%\",\"bottom\":\"7.45%\",\"width\":\"35%\",\"height\":\"35%\",\"src\":\"\"},            {\"type\":\"image\",\"left\":\"60%\",\"bottom\":\"6.84%\",\"width\":\"35%\",\"height\":\"35%\",\"src\":\"\"}        ]    }",
-    "input: - resolution: 1920x600\n- num_images: 1",
-    "output: {        \"resolution\": \"1920x600\",        \"num_images\": 1,        \"objects\": [            {\"type\":\"text\",\"left\":\"7.86%\",\"bottom\":\"49.62%\",\"width\":\"48%\",\"height\":\"100%\",\"fontSize\":38,\"fill\":\"\",\"fontWeight\":\"bold\",\"fontStyle\":\"\",\"textAlign\":\"left\",\"text\":\"\",\"fontFamily\":\"Gill Sans MT\"},            {\"type\":\"text\",\"left\":\"7.44%\",\"bottom\":\"36.78%\",\"width\":\"48%\",\"height\":\"100%\",\"fontSize\":50,\"fill\":\"\",\"fontWeight\":\"bold\",\"fontStyle\":\"normal\",\"textAlign\":\"left\",\"text\":\"\",\"fontFamily\":\"Arial Black\"},            {\"type\":\"image\",\"left\":\"70%\",\"bottom\":\"7%\",\"width\":\"55%\",\"height\":\"55%\",\"src\":\"\"},        ]    }",
-    "input: - resolution: 1024x512\n- num_images: 2",
-    "output: {        \"resolution\": \"1024x512\",        \"num_images\": 2,        \"objects\": [            {\"type\":\"text\",\"left\":\"7.86%\",\"bottom\":\"49.62%\",\"width\":\"48%\",\"height\":\"100%\",\"fontSize\":30,\"fill\":\"\",\"fontWeight\":\"bold\",\"fontStyle\":\"\",\"textAlign\":\"left\",\"text\":\"\",\"fontFamily\":\"Gill Sans MT\"},            {\"type\":\"text\",\"left\":\"7.44%\",\"bottom\":\"36.78%\",\"width\":\"48%\",\"height\":\"100%\",\"fontSize\":40,\"fill\":\"\",\"fontWeight\":\"bold\",\"fontStyle\":\"normal\",\"textAlign\":\"left\",\"text\":\"\",\"fontFamily\":\"Arial Black\"},            {\"type\":\"image\",\"left\":\"60.42%\",\"bottom\":\"15.57%\",\"width\":\"45%\",\"height\":\"45%\",\"src\":\"\"},            {\"type\":\"image\",\"left\":\"68.42%\",\"bottom\":\"15.46%\",\"width\":\"45%\",\"height\":\"45%\",\"src\":\"\"}        ]    }",
-    "input: - resolution: 1024x512\n- num_images: 6",
-    "output: {        \"resolution\": \"1024x512\",        \"num_images\": 6,        \"objects\": [            {\"type\":\"text\",\"left\":\"32.00%\",\"bottom\":\"83.31%\",\"width\":\"58.46%\",\"height\":\"100%\",\"fontSize\":20,\"fill\":\"\",\"fontWeight\":\"bold\",\"fontStyle\":\"\",\"textAlign\":\"left\",\"text\":\"\",\"fontFamily\":\"Segoe Print\"},            {\"type\":\"text\",\"left\":\"35.63%\",\"bottom\":\"73.27%\",\"width\":\"53.78%\",\"height\":\"100%\",\"fontSize\":32,\"fill\":\"\",\"fontWeight\":\"bold\",\"fontStyle\":\"normal\",\"textAlign\":\"left\",\"text\":\"\",\"fontFamily\":\"Arial Black\"},            {\"type\":\"image\",\"left\":\"25.69%\",\"bottom\":\"6.00%\",\"width\":\"30%\",\"height\":\"30%\",\"src\":\"\"},            {\"type\":\"image\",\"left\":\"31.69%\",\"bottom\":\"6.00%\",\"width\":\"30%\",\"height\":\"30%\",\"src\":\"\"},            {\"type\":\"image\",\"left\":\"37.69%\",\"bottom\":\"6.45%\",\"width\":\"30%\",\"height\":\"30%\",\"src\":\"\"},            {\"type\":\"image\",\"left\":\"43.69%\",\"bottom\":\"6.00%\",\"width\":\"30%\",\"height\":\"30%\",\"src\":\"\"},            {\"type\":\"image\",\"left\":\"49.44%\",\"bottom\":\"6.45%\",\"width\":\"30%\",\"height\":\"30%\",\"src\":\"\"},            {\"type\":\"image\",\"left\":\"55.00%\",\"bottom\":\"5.84%\",\"width\":\"30%\",\"height\":\"30%\",\"src\":\"\"}        ]    }",
-    "input: - resolution: 1024x512\n- num_images: 1",
-    "output: {        \"resolution\": \"1024x512\",        \"num_images\": 1,        \"objects\": [            {\"type\":\"text\",\"left\":\"7.86%\",\"bottom\":\"49.62%\",\"width\":\"48%\",\"height\":\"100%\",\"fontSize\":30,\"fill\":\"\",\"fontWeight\":\"bold\",\"fontStyle\":\"\",\"textAlign\":\"left\",\"text\":\"\",\"fontFamily\":\"Gill Sans MT\"},            {\"type\":\"text\",\"left\":\"7.44%\",\"bottom\":\"36.78%\",\"width\":\"48%\",\"height\":\"100%\",\"fontSize\":40,\"fill\":\"\",\"fontWeight\":\"bold\",\"fontStyle\":\"normal\",\"textAlign\":\"left\",\"text\":\"\",\"fontFamily\":\"Arial Black\"},            {\"type\":\"image\",\"left\":\"65%\",\"bottom\":\"10%\",\"width\":\"52%\",\"height\":\"52%\",\"src\":\"\"}        ]    }",
-    "input: - resolution: 1024x512\n- num_images: 3",
-    "output: {        \"resolution\": \"1024x512\",        \"num_images\": 3,        \"objects\": [            {\"type\":\"text\",\"left\":\"7.86%\",\"bottom\":\"49.62%\",\"width\":\"48%\",\"height\":\"100%\",\"fontSize\":30,\"fill\":\"\",\"fontWeight\":\"bold\",\"fontStyle\":\"\",\"textAlign\":\"left\",\"text\":\"\",\"fontFamily\":\"Gill Sans MT\"},            {\"type\":\"text\",\"left\":\"7.44%\",\"bottom\":\"36.78%\",\"width\":\"48%\",\"height\":\"100%\",\"fontSize\":40,\"fill\":\"\",\"fontWeight\":\"bold\",\"fontStyle\":\"normal\",\"textAlign\":\"left\",\"text\":\"\",\"fontFamily\":\"Arial Black\"},            {\"type\":\"image\",\"left\":\"60.42%\",\"bottom\":\"15.57%\",\"width\":\"35%\",\"height\":\"35%\",\"src\":\"\"},            {\"type\":\"image\",\"left\":\"68.42%\",\"bottom\":\"15.46%\",\"width\":\"35%\",\"height\":\"35%\",\"src\":\"\"},            {\"type\":\"image\",\"left\":\"76.42%\",\"bottom\":\"16.39%\",\"width\":\"35%\",\"height\":\"35%\",\"src\":\"\"}        ]    }",
-    "input: - resolution: 1024x480\n- num_images: 3",
-    "output: {        \"resolution\": \"1024x480\",        \"num_images\": 3,        \"objects\": [            {\"type\":\"text\",\"left\":\"7.86%\",\"bottom\":\"49.62%\",\"width\":\"48%\",\"height\":\"100%\",\"fontSize\":28,\"fill\":\"\",\"fontWeight\":\"bold\",\"fontStyle\":\"\",\"textAlign\":\"left\",\"text\":\"\",\"fontFamily\":\"Gill Sans MT\"},            {\"type\":\"text\",\"left\":\"7.44%\",\"bottom\":\"36.78%\",\"width\":\"48%\",\"height\":\"100%\",\"fontSize\":36,\"fill\":\"\",\"fontWeight\":\"bold\",\"fontStyle\":\"normal\",\"textAlign\":\"left\",\"text\":\"\",\"fontFamily\":\"Arial Black\"},            {\"type\":\"image\",\"left\":\"60.42%\",\"bottom\":\"15.57%\",\"width\":\"30%\",\"height\":\"30%\",\"src\":\"\"},            {\"type\":\"image\",\"left\":\"68.42%\",\"bottom\":\"15.46%\",\"width\":\"30%\",\"height\":\"30%\",\"src\":\"\"},            {\"type\":\"image\",\"left\":\"76.42%\",\"bottom\":\"16.39%\",\"width\":\"30%\",\"height\":\"30%\",\"src\":\"\"}        ]    }",
-    "input: - resolution: 1360x800\n- num_images: 8",
-    "output: {        \"resolution\": \"1360x800\",        \"num_images\": 8,        \"objects\": [            {\"type\":\"text\",\"left\":\"19.25%\",\"bottom\":\"81.76%\",\"width\":\"65.31%\",\"height\":\"100%\",\"fontSize\":48,\"fill\":\"\",\"fontWeight\":\"bold\",\"fontStyle\":\"\",\"textAlign\":\"left\",\"text\":\"\",\"fontFamily\":\"Segoe Print\"},            {\"type\":\"text\",\"left\":\"21.25%\",\"bottom\":\"71.73%\",\"width\":\"59.44%\",\"height\":\"100%\",\"fontSize\":64,\"fill\":\"\",\"fontWeight\":\"bold\",\"fontStyle\":\"normal\",\"textAlign\":\"left\",\"text\":\"\",\"fontFamily\":\"Arial Black\"},            {\"type\":\"image\",\"left\":\"12.63%\",\"bottom\":\"4.16%\",\"width\":\"40%\",\"height\":\"40%\",\"src\":\"\"},            {\"type\":\"image\",\"left\":\"22.63%\",\"bottom\":\"4.16%\",\"width\":\"40%\",\"height\":\"40%\",\"src\":\"\"},            {\"type\":\"image\",\"left\":\"31.88%\",\"bottom\":\"4.61%\",\"width\":\"40%\",\"height\":\"40%\",\"src\":\"\"},            {\"type\":\"image\",\"left\":\"42.63%\",\"bottom\":\"4.16%\",\"width\":\"40%\",\"height\":\"40%\",\"src\":\"\"},            {\"type\":\"image\",\"left\":\"52.63%\",\"bottom\":\"4.61%\",\"width\":\"40%\",\"height\":\"40%\",\"src\":\"\"},            {\"type\":\"image\",\"left\":\"62.00%\",\"bottom\":\"4.00%\",\"width\":\"40%\",\"height\":\"40%\",\"src\":\"\"},            {\"type\":\"image\",\"left\":\"71.38%\",\"bottom\":\"4.61%\",\"width\":\"40%\",\"height\":\"40%\",\"src\":\"\"},            {\"type\":\"image\",\"left\":\"80.63%\",\"bottom\":\"4.16%\",\"width\":\"40%\",\"height\":\"40%\",\"src\":\"\"}        ]    }",
-    "input: - resolution: 1920x600\n- num_images: 5",
-    "output: {        \"resolution\": \"1920x600\",        \"num_images\": 5,        \"objects\": [            {\"type\":\"text\",\"left\":\"33.49%\",\"bottom\":\"83.35%\",\"width\":\"58.46%\",\"height\":\"100%\",\"fontSize\":30,\"fill\":\"\",\"fontWeight\":\"bold\",\"fontStyle\":\"\",\"textAlign\":\"left\",\"text\":\"\",\"fontFamily\":\"Segoe Print\"},            {\"type\":\"text\",\"left\":\"35.13%\",\"bottom\":\"73.31%\",\"width\":\"53.78%\",\"height\":\"100%\",\"fontSize\":48,\"fill\":\"\",\"fontWeight\":\"bold\",\"fontStyle\":\"normal\",\"textAlign\":\"left\",\"text\":\"\",\"fontFamily\":\"Arial Black\"},            {\"type\":\"image\",\"left\":\"30.69%\",\"bottom\":\"7.00%\",\"width\":\"35%\",\"height\":\"35%\",\"src\":\"\"},            {\"type\":\"image\",\"left\":\"36.69%\",\"bottom\":\"7.00%\",\"width\":\"35%\",\"height\":\"35%\",\"src\":\"\"},            {\"type\":\"image\",\"left\":\"42.69%\",\"bottom\":\"7.45%\",\"width\":\"35%\",\"height\":\"35%\",\"src\":\"\"},            {\"type\":\"image\",\"left\":\"48.69%\",\"bottom\":\"7.00%\",\"width\":\"35%\",\"height\":\"35%\",\"src\":\"\"},            {\"type\":\"image\",\"left\":\"54.44%\",\"bottom\":\"7.45%\",\"width\":\"35%\",\"height\":\"35%\",\"src\":\"\"}        ]    }",
-    "input: - resolution: 1200x600\n- num_images: 1",
-    "output: {        \"resolution\": \"1200x600\",        \"num_images\": 1,        \"objects\": [            {\"type\":\"text\",\"left\":\"7.86%\",\"bottom\":\"49.62%\",\"width\":\"48%\",\"height\":\"100%\",\"fontSize\":36,\"fill\":\"\",\"fontWeight\":\"bold\",\"fontStyle\":\"\",\"textAlign\":\"left\",\"text\":\"\",\"fontFamily\":\"Gill Sans MT\"},            {\"type\":\"text\",\"left\":\"7.44%\",\"bottom\":\"36.78%\",\"width\":\"48%\",\"height\":\"100%\",\"fontSize\":48,\"fill\":\"\",\"fontWeight\":\"bold\",\"fontStyle\":\"normal\",\"textAlign\":\"left\",\"text\":\"\",\"fontFamily\":\"Arial Black\"},            {\"type\":\"image\",\"left\":\"65%\",\"bottom\":\"10%\",\"width\":\"50%\",\"height\":\"50%\",\"src\":\"\"}        ]    }",
-    "input: - resolution: 1200x600\n- num_images: 5",
-    "output: {        \"resolution\": \"1200x600\",        \"num_images\": 5,        \"objects\": [            {\"type\":\"text\",\"left\":\"26.49%\",\"bottom\":\"83.35%\",\"width\":\"58.46%\",\"height\":\"100%\",\"fontSize\":30,\"fill\":\"\",\"fontWeight\":\"bold\",\"fontStyle\":\"\",\"textAlign\":\"left\",\"text\":\"\",\"fontFamily\":\"Segoe Print\"},            {\"type\":\"text\",\"left\":\"31.13%\",\"bottom\":\"73.31%\",\"width\":\"53.78%\",\"height\":\"100%\",\"fontSize\":48,\"fill\":\"\",\"fontWeight\":\"bold\",\"fontStyle\":\"normal\",\"textAlign\":\"left\",\"text\":\"\",\"fontFamily\":\"Arial Black\"},            {\"type\":\"image\",\"left\":\"25.69%\",\"bottom\":\"7.00%\",\"width\":\"35%\",\"height\":\"35%\",\"src\":\"\"},            {\"type\":\"image\",\"left\":\"31.69%\",\"bottom\":\"7.00%\",\"width\":\"35%\",\"height\":\"35%\",\"src\":\"\"},            {\"type\":\"image\",\"left\":\"37.69%\",\"bottom\":\"7.45%\",\"width\":\"35%\",\"height\":\"35%\",\"src\":\"\"},            {\"type\":\"image\",\"left\":\"43.69%\",\"bottom\":\"7.00%\",\"width\":\"35%\",\"height\":\"35%\",\"src\":\"\"},            {\"type\":\"image\",\"left\":\"49.44%\",\"bottom\":\"7.45%\",\"width\":\"35%\",\"height\":\"35%\",\"src\":\"\"}        ]    }",
-    "input: - resolution: 1200x600\n- num_images: 2",
-    "output: {        \"resolution\": \"1200x600\",        \"num_images\": 2,        \"objects\": [            {\"type\":\"text\",\"left\":\"7.86%\",\"bottom\":\"49.62%\",\"width\":\"48%\",\"height\":\"100%\",\"fontSize\":36,\"fill\":\"\",\"fontWeight\":\"bold\",\"fontStyle\":\"\",\"textAlign\":\"left\",\"text\":\"\",\"fontFamily\":\"Monotype Corsiva\"},            {\"type\":\"text\",\"left\":\"7.44%\",\"bottom\":\"36.78%\",\"width\":\"48%\",\"height\":\"100%\",\"fontSize\":48,\"fill\":\"\",\"fontWeight\":\"bold\",\"fontStyle\":\"normal\",\"textAlign\":\"left\",\"text\":\"\",\"fontFamily\":\"Arial Black\"},            {\"type\":\"image\",\"left\":\"60.42%\",\"bottom\":\"15.57%\",\"width\":\"40%\",\"height\":\"40%\",\"src\":\"\"},            {\"type\":\"image\",\"left\":\"68.42%\",\"bottom\":\"15.46%\",\"width\":\"40%\",\"height\":\"40%\",\"src\":\"\"}        ]    }",
-    f"input: - resolution: {resolution}\n- num_images: {num_images}",
-    "output: ",
-    ])
-    print("generated Template:", parse_gemini_response(response.text))
-    return parse_gemini_response(response.text);
+    prompt = build_template_prompt(resolution, num_images)
+    try:
+        response = call_backend(gemini_backend, gemini_generate, "gemini-1.5-flash", prompt, generation_config)
+        template, errors = parse_template_response(response.text, resolution, num_images)
+        if errors:
+            logging.warning(f"Generated template for {resolution} with {num_images} images is invalid, retrying: {errors}")
+            response = call_backend(gemini_backend, gemini_generate, "gemini-1.5-flash", prompt + [
+                "previous output: " + response.text,
+                "That output is invalid: " + "; ".join(errors) + ". Return the corrected JSON only.",
+            ], generation_config)
+            template, errors = parse_template_response(response.text, resolution, num_images)
+    except Exception as e:
+        logging.error(f"Template generation with Gemini failed ({type(e).__name__}: {str(e)}), solving the layout locally")
+        return None
+    if errors:
+        logging.error(f"Giving up on generated template for {resolution} with {num_images} images: {errors}")
+        return None
+    logging.debug(f"generated Template: {template}")
+    try:
+        # the model's own resolution and counts aren't trusted
+        return Template.from_dict({"resolution": resolution, "num_images": num_images, "objects": template['objects']})
+    except ValueError as e:
+        logging.error(f"Generated template for {resolution} with {num_images} images can't be used ({str(e)}), solving the layout locally")
+        return None
 
 def select_template(resolution, num_images):
     """
     Selects the appropriate template based on resolution and number of images.
-    Falls back to a default template if no exact match is found.
-    """
-    filtered_templates = []
-    for template in TEMPLATES:
-        if template['resolution'] == resolution and template['num_images'] == num_images:
-            # add to filtered templates
-            filtered_templates.append(template)
-    # if filtered templates are not empty, return a random template from filtered templates
-    if filtered_templates:
-        return random.choice(filtered_templates)
-    else:
-        return generate_template_with_gemini(resolution, num_images)
-    
+    Tries an exact match, then a previously generated template, then the nearest
+    template rescaled to the resolution, and only then generates one with Gemini.
+    Returns None with TEMPLATE_GENERATOR=solver, or when Gemini produced no valid template;
+    the layout is then solved locally by prepare_template once the image sizes are known.
+    """
+    template = template_registry.exact(resolution, num_images)
+    if template is not None:
+        TEMPLATE_SOURCES.inc(source="exact")
+        return template
 
-def generate_banner(promotion, theme, resolution, color_palette, image_data_list):
+    cached_template = template_store.get(resolution, num_images)
+    if cached_template is not None:
+        TEMPLATE_SOURCES.inc(source="store")
+        return cached_template
+
+    scaled_template = template_registry.scaled(resolution, num_images)
+    if scaled_template is not None:
+        TEMPLATE_SOURCES.inc(source="scaled")
+        return scaled_template
+
+    if TEMPLATE_GENERATOR == "solver":
+        return None
+
+    generated_template = generate_template_with_gemini(resolution, num_images)
+    if generated_template is not None:
+        TEMPLATE_SOURCES.inc(source="gemini")
+        template_store.put(resolution, num_images, generated_template)
+    return generated_template
+
+@contextmanager
+def timed_stage(timings, name):
+    """
+    Records the wall time of a stage (in ms) into the timings dict and the stage histogram,
+    plus a span when timings is a RequestTrace.
+    """
+    start = time.perf_counter()
     try:
-        num_images = len(image_data_list)
-        # print("Number of images: ", num_images)
-
-        input_images_list = []
-        has_atleast_one_potrait_image = False
-        for image_data in image_data_list: # converting base64 encoded data to image for gemini api request
-            decoded_image = Image.open(io.BytesIO( base64.b64decode(image_data.split(",")[1])))
-            input_images_list.append(decoded_image)
-            img_width, img_height = decoded_image.size #could be used for checking if image is landscape or potrait
-            print("IMAGE RES: ", f'{img_width}, {img_height}')
-            if img_height > img_width:
-                has_atleast_one_potrait_image = True
-        
-        
-        selected_template = select_template(resolution, num_images)
-        template = round_percentages(copy.deepcopy(selected_template))
-        
-        # modifying the current template position of images if all images are of landscape resolution
-        if not has_atleast_one_potrait_image:
-            for obj in template['objects']:
-                if obj['type'] == 'image':
-                    if 'bottom' in obj and 'left' in obj:
-                        bottom = int(obj['bottom'].rstrip('%'))
-                        left = int(obj['left'].rstrip('%'))
-                        obj['bottom'] = str(min(100, bottom + 15)) + "%" #inc by 15%
-                        obj['left'] = str(max(0, left - 5)) + "%" #dec by 5%
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        STAGE_SECONDS.observe(duration, stage=RESOLUTION_SUFFIX.sub("", name))
+        if timings is not None:
+            timings[name] = round(duration * 1000, 1)
+            if isinstance(timings, RequestTrace):
+                timings.add_span(name, start, duration)
+
+def run_stage(timings, name, func, *args):
+    with timed_stage(timings, name):
+        return func(*args)
 
+def oriented_size(image):
+    """(width, height) of an image as displayed, i.e. with its EXIF orientation applied."""
+    width, height = image.size
+    if image.getexif().get(0x0112) in (5, 6, 7, 8):
+        return height, width
+    return width, height
+
+def decode_image(image_data):
+    """Decodes one uploaded image into (src for the template, thumbnail for the design call, displayed size)."""
+    image_bytes, decoded_image = decode_image_data(image_data)
+    IMAGE_BYTES.observe(len(image_bytes), kind="upload")
+    size = oriented_size(decoded_image) # before the thumbnail, which may shrink the decoded image
+    return image_src(image_bytes, decoded_image), make_vision_thumbnail(decoded_image), size
+
+def decode_images(image_data_list):
+    """
+    Decodes the uploaded images once per request, concurrently on decode_executor when there
+    are several. Returns (srcs for the template, thumbnails for the design call, displayed
+    (width, height) of each image).
+    """
+    if len(image_data_list) > 1:
+        decoded = list(decode_executor.map(decode_image, image_data_list))
+    else:
+        decoded = [decode_image(image_data) for image_data in image_data_list]
+    image_src_list = [src for src, _, _ in decoded]
+    input_images_list = [thumbnail for _, thumbnail, _ in decoded]
+    image_sizes = [size for _, _, size in decoded]
+    logging.debug(f"Image sizes: {image_sizes}")
+    return image_src_list, input_images_list, image_sizes
+
+def prepare_template(selected_template, resolution, image_sizes):
+    """
+    Returns the template for this request. Without a stored template (selected_template is
+    None) the layout is solved locally from the real image sizes. The stored template is
+    shared, so changes make new records instead of touching it.
+    """
+    if selected_template is None:
+        TEMPLATE_SOURCES.inc(source="solver")
         width, height = map(int, resolution.split('x'))
+        return solve_layout(width, height, image_sizes)
+
+    template = selected_template.rounded()
+    has_atleast_one_potrait_image = any(img_height > img_width for img_width, img_height in image_sizes)
+
+    # modifying the current template position of images if all images are of landscape resolution
+    if not has_atleast_one_potrait_image:
+        template = template._replace(objects=tuple(
+            obj._replace(bottom=min(100, obj.bottom + 15), left=max(0, obj.left - 5)) #inc bottom by 15%, dec left by 5%
+            if obj.type == 'image' and obj.bottom is not None else obj
+            for obj in template.objects
+        ))
+    return template
 
-        # Generate background image
-        background_image_path = generate_background(theme, color_palette, width, height)[0]
-        background_image_base64 = image_to_base64(background_image_path)
-        background_image = Image.open(io.BytesIO( base64.b64decode(background_image_base64))) # for sending background image to gemini
-       
-        
+def request_design_choices(template, promotion, theme, width, height, color_palette, background_image, input_images_list):
+    """
+    Asks Gemini for the banner text (and, with TEXT_COLOR_MODE=gemini, colors) given the
+    background and product thumbnails.
+    """
+    if TEXT_COLOR_MODE == "local":
         prompt = f"""
         Create a banner design based on the following:
-        Template: {template['objects']}
+        Promotion: {promotion}
+        Theme: {theme}
+        Background image: <the first image is background image of banner design>
+        Product images: <the images except the first one are product images of banner design>
+
+        Return JSON only:
+        {{
+        "products": <write name of each product seperated by ",">,
+        "mainText": "<promotion text, keep it short>",
+        "secondaryText": "<if applicable, max 7 words, be creative based on products>"
+        }}
+        Return JSON only.
+        """
+    else:
+        prompt = f"""
+        Create a banner design based on the following:
+        Template: {[obj.to_dict() for obj in template.objects]}
         Promotion: {promotion}
         Theme: {theme}
         Resolution: {width}x{height}
@@ -450,88 +911,314 @@ def generate_banner(promotion, theme, resolution, color_palette, image_data_list
         Apply design principles for readability and prominence. Return JSON only.
         """
 
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        response = model.generate_content([prompt, background_image]+input_images_list) #input_images_list has input images
-
-        logging.debug(f"Gemini API response: {response.text}")
+    try:
+        response = call_backend(gemini_backend, gemini_generate, 'gemini-1.5-flash', [prompt, make_vision_thumbnail(background_image)]+input_images_list) #input_images_list has input images
+    except Exception as e:
+        logging.warning(f"Gemini unavailable ({type(e).__name__}: {str(e)}), using the promotion as the banner text")
+        return fallback_design_choices(promotion)
 
+    try:
+        # .text itself raises ValueError when the response was blocked and has no parts
+        logging.debug(f"Gemini API response: {response.text[:2000]}")
         design_choices = parse_gemini_response(response.text)
+        if not isinstance(design_choices, dict):
+            raise ValueError(f"expected a JSON object, got {type(design_choices).__name__}")
+    except ValueError as e:
+        logging.warning(f"Gemini design response can't be used ({str(e)}), using the promotion as the banner text")
+        return fallback_design_choices(promotion)
+    return design_choices
+
+def fallback_design_choices(promotion):
+    """Design choices without a model call: the promotion as main text; colors come from with_local_colors."""
+    return {"products": "", "mainText": promotion, "secondaryText": "", "textColors": {}}
+
+HEX_COLOR = re.compile(r"^#(?:[0-9a-fA-F]{3}){1,2}$")
+
+def text_box(obj, text, width, height):
+    """Approximate box (fractions of the canvas) covered by a text object, placed like the editor does."""
+    font_size = obj.font_size
+    left = obj.left / 100
+    max_width = obj.width / 100
+    text_width = min(max_width, len(text or " ") * 0.6 * font_size / width)
+    top = 1 - (obj.bottom or 0) / 100 - font_size / height
+    return left, top, left + text_width, top + 1.16 * font_size / height
+
+def with_local_colors(template, design_choices, background_image, width, height):
+    """
+    Returns a copy of design_choices whose backgroundColors come from the background pixels and
+    whose text colors meet WCAG AA contrast against the pixels under each text box. The model's
+    suggestion is kept when it passes, otherwise the palette, white and black are tried in turn.
+    """
+    if TEXT_COLOR_MODE != "local":
+        return design_choices
+    small = analysis_image(background_image)
+    palette = extract_palette(small)
+    suggested = design_choices.get('textColors') or {}
+    smallest_font_size = get_smallest_font_size(template)
+    text_colors = {}
+    # largest text first, so the secondary text can avoid the main text's color
+    for obj in sorted((o for o in template.objects if o.type == 'text'), key=lambda o: -o.font_size):
+        role = 'mainText' if obj.font_size > smallest_font_size else 'secondaryText'
+        if role in text_colors:
+            continue
+        suggestion = suggested.get(role) if HEX_COLOR.match(str(suggested.get(role))) else None
+        luminance_range = region_luminance(small, text_box(obj, design_choices.get(role), width, height))
+        min_ratio = required_contrast(obj.font_size, obj.font_weight == 'bold')
+        text_colors[role] = choose_text_color([suggestion] + palette + ["#ffffff", "#000000"], luminance_range, min_ratio, avoid=text_colors.get('mainText'))
+    return {**design_choices, "backgroundColors": palette, "textColors": text_colors}
+
+def make_background_object(background_image_src):
+    return ImageObject(left=0, bottom=None, top=0, width=100, height=100, src=background_image_src)
+
+def with_background(template, background_object):
+    return template._replace(objects=(background_object,) + template.objects)
+
+def finalize_template(template, design_choices, width, height, image_src_list, background_image_src):
+    modified_template = apply_design_choices(template, design_choices, width, height, image_src_list)
+    return with_background(modified_template, make_background_object(background_image_src))
+
+def generate_banner(promotion, theme, resolution, color_palette, image_data_list, timings=None, background_style=None):
+    """
+    Builds the banner template. Template selection and background generation don't depend on
+    each other, so they run concurrently on stage_executor and are joined before the design call.
+    Per-stage wall times (ms) are written into `timings` when a dict is passed. With a
+    background_style the background is drawn locally instead of generated by Flux.
+    """
+    if timings is None:
+        timings = {}
+    try:
+        total_start = time.perf_counter()
+        num_images = len(image_data_list)
+        width, height = map(int, resolution.split('x'))
+
+        # Kick off the remote stages first so they overlap with the local image decoding
+        template_future = stage_executor.submit(run_stage, timings, "template", select_template, resolution, num_images)
+        background_future = stage_executor.submit(run_stage, timings, "background", make_background, theme, color_palette, width, height, background_style)
+
+        with timed_stage(timings, "decode"):
+            image_src_list, input_images_list, image_sizes = decode_images(image_data_list)
+
+        with timed_stage(timings, "join"):
+            selected_template = template_future.result()
+            background_bytes, background_image = background_future.result() # background_image is sent to gemini
+
+        template = prepare_template(selected_template, resolution, image_sizes)
+
+        # Encoding the background for the response overlaps with the design call
+        background_src_future = stage_executor.submit(run_stage, timings, "encode_background", background_src, background_bytes, background_image)
 
-        # Apply design choices 
-        modified_template = apply_design_choices(template, design_choices, width, height, image_data_list)
+        with timed_stage(timings, "design"):
+            design_choices = request_design_choices(template, promotion, theme, width, height, color_palette, background_image, input_images_list)
 
-        # Generate background image
-        # background_image_path = generate_background(theme, color_palette, width, height)[0]
-        # background_image_base64 = image_to_base64(background_image_path)
+        with timed_stage(timings, "colors"):
+            design_choices = with_local_colors(template, design_choices, background_image, width, height)
 
-        modified_template['objects'].insert(0, {
-            "type": "image",
-            "left": "0%",
-            "top": "0%",
-            "width": "100%",
-            "height": "100%",
-            "src": f"data:image/png;base64,{background_image_base64}"
-        })
+        background_image_src = background_src_future.result()
+        with timed_stage(timings, "apply"):
+            modified_template = finalize_template(template, design_choices, width, height, image_src_list, background_image_src)
 
+        timings["total"] = round((time.perf_counter() - total_start) * 1000, 1)
+        logging.info(f"generate_banner stage timings (ms): {timings}")
         return modified_template
-        # return responsive_template
     except Exception as e:
         logging.error(f"Error in generate_banner: {str(e)}")
         raise
 
+def generate_banner_events(promotion, theme, resolution, color_palette, image_data_list, timings=None, background_style=None):
+    """
+    Same pipeline as generate_banner, but yields partial results as soon as they exist so the
+    editor can draw early: "layout" (template geometry with product image srcs), "background",
+    "text" (text objects with Gemini's text and colors) and finally "done" with the full template.
+    """
+    if timings is None:
+        timings = {}
+    total_start = time.perf_counter()
+    num_images = len(image_data_list)
+    width, height = map(int, resolution.split('x'))
+
+    template_future = stage_executor.submit(run_stage, timings, "template", select_template, resolution, num_images)
+    background_future = stage_executor.submit(run_stage, timings, "background", make_background, theme, color_palette, width, height, background_style)
+
+    with timed_stage(timings, "decode"):
+        image_src_list, input_images_list, image_sizes = decode_images(image_data_list)
+
+    template = prepare_template(template_future.result(), resolution, image_sizes)
+    layout = apply_design_choices(template, {}, width, height, image_src_list)
+    yield {"event": "layout", "template": layout.to_dict()}
+
+    background_bytes, background_image = background_future.result()
+    background_object = make_background_object(background_src(background_bytes, background_image))
+    yield {"event": "background", "object": background_object.to_dict()}
+
+    with timed_stage(timings, "design"):
+        design_choices = request_design_choices(template, promotion, theme, width, height, color_palette, background_image, input_images_list)
+    with timed_stage(timings, "colors"):
+        design_choices = with_local_colors(template, design_choices, background_image, width, height)
+    modified_template = apply_design_choices(template, design_choices, width, height, image_src_list)
+    yield {"event": "text", "objects": [obj.to_dict() for obj in modified_template.objects if obj.type == 'text']}
+
+    modified_template = with_background(modified_template, background_object)
+    timings["total"] = round((time.perf_counter() - total_start) * 1000, 1)
+    logging.info(f"generate_banner_events stage timings (ms): {timings}")
+    yield {"event": "done", "template": modified_template.to_dict(), "timings": timings}
+
+def generate_banners(promotion, theme, resolutions, color_palette, image_data_list, timings=None, background_style=None):
+    """
+    Builds one banner per resolution for the same promotion. Images are decoded once, the
+    per-size backgrounds are generated concurrently (at most BATCH_BACKGROUND_CONCURRENCY at a
+    time) and a single design call, made with the first background that is ready, supplies the
+    text for every size.
+    """
+    if timings is None:
+        timings = {}
+    try:
+        total_start = time.perf_counter()
+        num_images = len(image_data_list)
+        sizes = {resolution: tuple(map(int, resolution.split('x'))) for resolution in resolutions}
+
+        template_futures = {
+            resolution: stage_executor.submit(run_stage, timings, f"template_{resolution}", select_template, resolution, num_images)
+            for resolution in sizes
+        }
+        with ThreadPoolExecutor(max_workers=BATCH_BACKGROUND_CONCURRENCY, thread_name_prefix="banner-batch") as background_pool:
+            background_futures = {
+                background_pool.submit(run_stage, timings, f"background_{resolution}", make_background, theme, color_palette, width, height, background_style): resolution
+                for resolution, (width, height) in sizes.items()
+            }
+
+            with timed_stage(timings, "decode"):
+                image_src_list, input_images_list, image_sizes = decode_images(image_data_list)
+
+            templates = {}
+            background_images = {}
+            background_srcs = {}
+            design_future = None
+            for future in as_completed(background_futures):
+                resolution = background_futures[future]
+                width, height = sizes[resolution]
+                templates[resolution] = prepare_template(template_futures[resolution].result(), resolution, image_sizes)
+                background_bytes, background_image = future.result()
+                background_images[resolution] = background_image
+                background_srcs[resolution] = stage_executor.submit(background_src, background_bytes, background_image)
+                if design_future is None:
+                    # The first ready background drives the shared design call while the rest are still generating
+                    design_future = stage_executor.submit(
+                        run_stage, timings, "design", request_design_choices, templates[resolution],
+                        promotion, theme, width, height, color_palette, background_image, input_images_list,
+                    )
+
+        design_choices = design_future.result()
+        banners = []
+        for resolution, (width, height) in sizes.items():
+            # text is shared, but colors are checked against each size's own background
+            choices = with_local_colors(templates[resolution], design_choices, background_images[resolution], width, height)
+            banners.append(finalize_template(templates[resolution], choices, width, height, image_src_list, background_srcs[resolution].result()))
+
+        timings["total"] = round((time.perf_counter() - total_start) * 1000, 1)
+        logging.info(f"generate_banners stage timings (ms): {timings}")
+        return banners
+    except Exception as e:
+        logging.error(f"Error in generate_banners: {str(e)}")
+        raise
+
+def fabric_json(result):
+    """Serializes a Template, or the list from generate_banners, to the fabric JSON the editor loads."""
+    if isinstance(result, Template):
+        return result.to_dict()
+    return {"banners": [banner.to_dict() for banner in result]}
+
+def fabric_job(func, *args, **kwargs):
+    """Runs a generation on the job queue; job results are kept as fabric JSON for /jobs."""
+    return fabric_json(func(*args, **kwargs))
+
+def image_content_hash(image_data):
+    """sha256 of the image bytes, so the same image sent as a data URL, bare base64 or a file hashes alike."""
+    if hasattr(image_data, "seek"):
+        digest = hashlib.sha256(image_data.read()).hexdigest()
+        image_data.seek(0)
+        return digest
+    return hashlib.sha256(read_image_data(image_data)).hexdigest()
+
+def request_key(kind, promotion, theme, resolution, color_palette, image_data_list, background_style=None):
+    """Hash of a normalized generation request; requests that differ only in whitespace or case of the theme and colors share it."""
+    normalized = {
+        "kind": kind,
+        "promotion": " ".join(promotion.split()),
+        "theme": " ".join(theme.lower().split()),
+        "resolution": resolution,
+        "color_palette": [color.strip().lower() for color in color_palette],
+        "images": [image_content_hash(image_data) for image_data in image_data_list],
+        "background_style": background_style,
+    }
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode()).hexdigest()
+
+def coalesce(kind, func, promotion, theme, resolution, color_palette, image_data_list, timings=None, background_style=None):
+    """Runs func through the coalescer; a request that shares another's result records its wait as "coalesced"."""
+    if coalescer is None:
+        return func(promotion, theme, resolution, color_palette, image_data_list, timings, background_style)
+    start = time.perf_counter()
+    key = request_key(kind, promotion, theme, resolution, color_palette, image_data_list, background_style)
+    result, shared = coalescer.do(key, func, promotion, theme, resolution, color_palette, image_data_list, timings, background_style)
+    if shared:
+        logging.info(f"Coalesced {kind} request {key[:12]} with an identical one")
+        if timings is not None:
+            timings["coalesced"] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+def generate_banner_coalesced(promotion, theme, resolution, color_palette, image_data_list, timings=None, background_style=None):
+    return coalesce("banner", generate_banner, promotion, theme, resolution, color_palette, image_data_list, timings, background_style)
+
+def generate_banners_coalesced(promotion, theme, resolutions, color_palette, image_data_list, timings=None, background_style=None):
+    return coalesce("banners", generate_banners, promotion, theme, resolutions, color_palette, image_data_list, timings, background_style)
+
+def request_timings(name):
+    """The timings dict for a synchronous generation; a RequestTrace kept for /traces when TRACE_REQUESTS is on."""
+    if not TRACE_REQUESTS:
+        return {}
+    g.trace = RequestTrace(name)
+    return g.trace
+
+def server_timing_header(timings):
+    """Formats stage timings as a Server-Timing header value (visible in browser devtools)."""
+    return ", ".join(f"{name};dur={duration}" for name, duration in timings.items())
+
 def parse_gemini_response(response_text):
     try:
-        clean_text = response_text.replace('```json', '').replace('```', '').strip()
-        return json.loads(clean_text)
+        return loads_lenient(response_text)
     except json.JSONDecodeError as e:
         logging.error(f"JSON parsing error: {str(e)}")
         logging.error(f"Raw response: {response_text}")
         raise ValueError("Invalid JSON response from Gemini API")
     
 def get_smallest_font_size(template):
-    smallest_font_size = float('inf')
-    for obj in template['objects']:
-        if obj['type'] == 'text':
-            if obj['fontSize'] < smallest_font_size:
-                smallest_font_size = obj['fontSize']
-    return smallest_font_size
-
-def apply_design_choices(template, choices, width, height, image_data_list):
-    # Reset image_index for each function call
+    return min((obj.font_size for obj in template.objects if obj.type == 'text'), default=float('inf'))
+
+def apply_design_choices(template, choices, width, height, image_src_list):
+    """
+    Returns a copy of the template with the text and colors from choices and the product image
+    srcs filled in; image objects without a src are dropped.
+    """
     image_index = 0
     # compare font size of text objects and store the smallest one
     smallest_font_size = get_smallest_font_size(template)
 
-    for obj in template['objects']:
-        if obj['type'] == 'text':
-            if 'mainText' in choices and obj['fontSize'] > smallest_font_size:
-                obj['text'] = choices['mainText'] or ""
-                obj['fill'] = choices['textColors'].get('mainText', '#000000')
-            elif 'secondaryText' in choices and obj['fontSize'] <= smallest_font_size:
-                obj['text'] = choices['secondaryText'] or ""
-                obj['fill'] = choices['textColors'].get('secondaryText', '#000000')
-
-            obj['fontFamily'] = obj.get('fontFamily', 'Arial')
-            obj['fontSize'] = obj.get('fontSize', 20)
-            obj['fontWeight'] = obj.get('fontWeight', 'normal')
-            obj['fontStyle'] = obj.get('fontStyle', 'normal')
-            obj['textAlign'] = obj.get('textAlign', 'left')
-
-        elif obj['type'] == 'image':
-            if image_index < len(image_data_list) and image_data_list[image_index]:
-                obj['src'] = f"data:image/jpeg;base64,{image_data_list[image_index]}"
+    objects = []
+    for obj in template.objects:
+        if obj.type == 'text':
+            if 'mainText' in choices and obj.font_size > smallest_font_size:
+                obj = obj._replace(text=choices['mainText'] or "", fill=choices['textColors'].get('mainText', '#000000'))
+            elif 'secondaryText' in choices and obj.font_size <= smallest_font_size:
+                obj = obj._replace(text=choices['secondaryText'] or "", fill=choices['textColors'].get('secondaryText', '#000000'))
+        elif obj.type == 'image':
+            if image_index < len(image_src_list) and image_src_list[image_index]:
+                obj = obj._replace(src=image_src_list[image_index])
                 image_index += 1
             else:
                 # Remove the image object if no data is available
-                obj['src'] = ''
-
-    # Remove any image objects with empty src
-    template['objects'] = [obj for obj in template['objects'] if obj['type'] != 'image' or obj['src']]
+                continue
+        objects.append(obj)
 
-    template['width'] = width
-    template['height'] = height
-
-    return template
+    return template._replace(objects=tuple(objects), width=width, height=height)
 
 @app.route('/generate_banner', methods=['POST'])
 def create_banner():
@@ -542,13 +1229,315 @@ def create_banner():
         resolution = data['resolution']
         color_palette = data['color_palette']
         image_data_list = data['images']
+        try:
+            check_resolution(resolution)
+            background_style = choose_background_style(data.get('background_mode'), data.get('latency_budget_ms'))
+        except InvalidRequest as e:
+            return jsonify({"error": str(e)}), 400
 
-        banner_data = generate_banner(promotion, theme, resolution, color_palette, image_data_list)
-        return jsonify(banner_data)
+        if request.args.get('async') == '1':
+            return submit_job(generate_banner_coalesced, promotion, theme, resolution, color_palette, image_data_list, background_style=background_style)
+
+        timings = request_timings("create_banner")
+        with generation_admission:
+            banner_data = generate_banner_coalesced(promotion, theme, resolution, color_palette, image_data_list, timings, background_style)
+        with timed_stage(timings, "serialize"):
+            response = jsonify(banner_data.to_dict())
+        response.headers['Server-Timing'] = server_timing_header(timings)
+        return response
+    except Overloaded as e:
+        return overloaded_response(e)
+    except InvalidRequest as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         logging.error(f"Error in create_banner: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/generate_banner/upload', methods=['POST'])
+def upload_banner():
+    """
+    Multipart variant of /generate_banner: the images come as files in `images` (repeated) and
+    the other fields as form fields, with `color_palette` comma-separated. The files are streamed
+    into spooled temp files instead of being held in memory as base64 JSON.
+    """
+    if request.content_length and UploadRequest.max_upload_bytes and request.content_length > UploadRequest.max_upload_bytes:
+        return jsonify({"error": f"Uploads may be at most {UploadRequest.max_upload_bytes} bytes in total"}), 413
+    try:
+        form = request.form
+        promotion = form['promotion']
+        theme = form['theme']
+        resolution = form['resolution']
+        color_palette = [color.strip() for color in form['color_palette'].split(',') if color.strip()]
+        images = request.files.getlist('images')
+        check_resolution(resolution)
+        background_style = choose_background_style(form.get('background_mode'), form.get('latency_budget_ms'))
+    except RequestEntityTooLarge as e:
+        return jsonify({"error": e.description}), 413
+    except KeyError as e:
+        return jsonify({"error": f"Missing field: {e.args[0]}"}), 400
+    except InvalidRequest as e:
+        return jsonify({"error": str(e)}), 400
+    if not images:
+        return jsonify({"error": "At least one file in 'images' is required"}), 400
+
+    try:
+        if request.args.get('async') == '1':
+            # the spooled files are closed with the request, so a queued job gets the bytes
+            return submit_job(generate_banner_coalesced, promotion, theme, resolution, color_palette, [image.read() for image in images], background_style=background_style)
+
+        timings = request_timings("upload_banner")
+        with generation_admission:
+            banner_data = generate_banner_coalesced(promotion, theme, resolution, color_palette, images, timings, background_style)
+        with timed_stage(timings, "serialize"):
+            response = jsonify(banner_data.to_dict())
+        response.headers['Server-Timing'] = server_timing_header(timings)
+        return response
+    except Overloaded as e:
+        return overloaded_response(e)
+    except InvalidRequest as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logging.error(f"Error in upload_banner: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/generate_banner/stream', methods=['POST'])
+def stream_banner():
+    """Streams generate_banner_events as newline-delimited JSON, one event per line."""
+    try:
+        data = request.json
+        args = (data['promotion'], data['theme'], data['resolution'], data['color_palette'], data['images'])
+        check_resolution(data['resolution'])
+        background_style = choose_background_style(data.get('background_mode'), data.get('latency_budget_ms'))
+    except Exception as e:
+        return jsonify({"error": f"Invalid request: {str(e)}"}), 400
+    try:
+        generation_admission.acquire()
+    except Overloaded as e:
+        return overloaded_response(e)
+
+    def events():
+        try:
+            for event in generate_banner_events(*args, background_style=background_style):
+                yield json.dumps(event) + "\n"
+        except Exception as e:
+            logging.error(f"Error in stream_banner: {str(e)}")
+            yield json.dumps({"event": "error", "error": str(e)}) + "\n"
+
+    response = Response(events(), mimetype='application/x-ndjson', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # released when the server closes the response, even if the client disconnects mid-stream
+    response.call_on_close(generation_admission.release)
+    return response
+
+@app.route('/generate_banners', methods=['POST'])
+def create_banners():
+    try:
+        data = request.json
+        promotion = data['promotion']
+        theme = data['theme']
+        # dict.fromkeys drops duplicate sizes while keeping the requested order
+        resolutions = list(dict.fromkeys(data['resolutions']))
+        color_palette = data['color_palette']
+        image_data_list = data['images']
+        try:
+            for resolution in resolutions:
+                check_resolution(resolution)
+            background_style = choose_background_style(data.get('background_mode'), data.get('latency_budget_ms'))
+        except InvalidRequest as e:
+            return jsonify({"error": str(e)}), 400
+
+        if not resolutions:
+            return jsonify({"error": "At least one resolution is required"}), 400
+        if len(resolutions) > BATCH_MAX_RESOLUTIONS:
+            return jsonify({"error": f"At most {BATCH_MAX_RESOLUTIONS} resolutions per request"}), 400
+
+        if request.args.get('async') == '1':
+            return submit_job(generate_banners_coalesced, promotion, theme, resolutions, color_palette, image_data_list, background_style=background_style)
+
+        timings = request_timings("create_banners")
+        with generation_admission:
+            banners = generate_banners_coalesced(promotion, theme, resolutions, color_palette, image_data_list, timings, background_style)
+        with timed_stage(timings, "serialize"):
+            response = jsonify(fabric_json(banners))
+        response.headers['Server-Timing'] = server_timing_header(timings)
+        return response
+    except Overloaded as e:
+        return overloaded_response(e)
+    except InvalidRequest as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logging.error(f"Error in create_banners: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.before_request
+def start_request_metrics():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    endpoint = request.endpoint or "unknown"
+    REQUEST_SECONDS.observe(time.perf_counter() - g.request_start, endpoint=endpoint, method=request.method, status=response.status_code)
+    if request.content_length:
+        REQUEST_BYTES.observe(request.content_length, endpoint=endpoint)
+    if not response.is_streamed and response.content_length is not None:
+        RESPONSE_BYTES.observe(response.content_length, endpoint=endpoint)
+    if 'trace' in g:
+        trace_buffer.add(g.trace)
+    return response
+
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.exposition(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/traces')
+def recent_traces():
+    """The last TRACE_BUFFER_SIZE request traces (empty unless TRACE_REQUESTS=1)."""
+    return jsonify({"traces": trace_buffer.recent()})
+
+def overloaded_response(error):
+    """503 with Retry-After for requests shed by generation_admission."""
+    response = jsonify({"error": f"Service overloaded, retry shortly ({str(error)})"})
+    response.status_code = 503
+    response.headers['Retry-After'] = '5'
+    return response
+
+def submit_job(func, *args, **kwargs):
+    """Queues a generation on job_queue and answers 202 with the job id, or 429 when the queue is full."""
+    try:
+        job = job_queue.submit(fabric_job, func, *args, **kwargs)
+    except QueueFullError:
+        response = jsonify({"error": "Too many banners in progress, retry shortly"})
+        response.status_code = 429
+        response.headers['Retry-After'] = '5'
+        return response
+    response = jsonify({"job_id": job.id, "status": job.status, "status_url": f"/jobs/{job.id}"})
+    response.status_code = 202
+    response.headers['Location'] = f"/jobs/{job.id}"
+    return response
+
+@app.route('/jobs/<job_id>')
+def get_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found or expired"}), 404
+    response = jsonify(job.to_dict())
+    if job.status == "done":
+        response.headers['Server-Timing'] = server_timing_header(job.timings)
+    return response
+
+@app.route('/jobs/<job_id>/events')
+def stream_job(job_id):
+    """Server-sent events with the job status; the last event carries the result or error."""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found or expired"}), 404
+
+    def events():
+        last_status = None
+        idle_seconds = 0
+        while True:
+            finished = job.done.is_set()
+            if finished or job.status != last_status:
+                last_status = job.status
+                idle_seconds = 0
+                yield f"event: status\ndata: {json.dumps(job.to_dict(include_result=finished))}\n\n"
+                if finished:
+                    return
+            elif idle_seconds >= 15:
+                idle_seconds = 0
+                yield ": keep-alive\n\n"
+            job.done.wait(timeout=1)
+            idle_seconds += 1
+
+    return Response(events(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def template_assets(template):
+    """Bytes of every /assets image referenced by a template, for the server-side renderer."""
+    assets = {}
+    for obj in template.objects:
+        src = obj.src if obj.type == 'image' else None
+        if src and src.startswith(ASSET_URL_PREFIX):
+            data = blob_store.get(src[len(ASSET_URL_PREFIX):])
+            if data is None:
+                raise ValueError(f"Asset {src} is no longer available")
+            assets[src] = data
+    return assets
+
+@app.route('/render', methods=['POST'])
+def render():
+    """Renders a template returned by /generate_banner into a finished PNG, WebP or JPEG."""
+    try:
+        data = request.json
+        template = Template.from_dict(data['template'])
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid template: {str(e)}"}), 400
+    try:
+        output_format = str(data.get('format', 'png')).lower()
+        if output_format not in OUTPUT_FORMATS:
+            return jsonify({"error": f"Unsupported output format: {output_format}"}), 400
+        check_canvas_size(template.width, template.height)
+        image_bytes = render_banner(template, template_assets(template), output_format, int(data.get('quality', 90)))
+        return app.response_class(image_bytes, mimetype=f"image/{'jpeg' if output_format == 'jpg' else output_format}")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logging.error(f"Error in render: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/assets/<asset_id>')
+def get_asset(asset_id):
+    """Serves a stored image by content address; the id never changes meaning, so it is cached forever."""
+    data = blob_store.get(asset_id) if is_valid_asset_id(asset_id) else None
+    if data is None:
+        return jsonify({"error": "Asset not found"}), 404
+    response = app.response_class(data, mimetype=mime_type_for(asset_id))
+    response.set_etag(asset_id.split('.')[0])
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response.make_conditional(request)
+
+@app.cli.command('warm-backgrounds')
+@click.argument('campaigns_file')
+def warm_backgrounds_command(campaigns_file):
+    """Pre-generates cached backgrounds from a JSON list of {"theme", "color_palette", "resolutions"}."""
+    with open(campaigns_file) as f:
+        campaigns = json.load(f)
+    for campaign in campaigns:
+        warm_background_cache(campaign['theme'], campaign['color_palette'], campaign['resolutions'])
+        print(f"Warmed backgrounds for {campaign['theme']}: {campaign['resolutions']}")
+
+@app.cli.command('render-banners')
+@click.argument('templates_file')
+@click.argument('output_dir')
+@click.option('--format', 'output_format', default='png', help='png, webp or jpeg')
+@click.option('--quality', default=90)
+@click.option('--processes', default=0, help='Render on a process pool of this size')
+def render_banners_command(templates_file, output_dir, output_format, quality, processes):
+    """Renders a JSON list of banner templates to image files in OUTPUT_DIR."""
+    with open(templates_file) as f:
+        templates = [Template.from_dict(template) for template in json.load(f)]
+    os.makedirs(output_dir, exist_ok=True)
+    images = render_many([(template, template_assets(template)) for template in templates], processes, output_format, quality)
+    for i, image_bytes in enumerate(images):
+        with open(os.path.join(output_dir, f"banner_{i}.{output_format}"), "wb") as f:
+            f.write(image_bytes)
+    print(f"Rendered {len(images)} banners to {output_dir}")
+
+@app.route('/healthz')
+def healthz():
+    """Liveness: the process is up and serving; says nothing about Flux or Gemini."""
+    return jsonify({"status": "ok"})
+
+@app.route('/readyz')
+def readyz():
+    """Readiness: 503 while the warm-up is still running or a backend failed to initialize."""
+    backends = clients.status()
+    warming_up = warm_up_thread is not None and warm_up_thread.is_alive()
+    failed = any(status.startswith("error") for status in backends.values())
+    ready = not warming_up and not failed
+    body = {"status": "ready" if ready else "warming up" if warming_up else "unavailable",
+            "backends": backends, "pending_jobs": job_queue.pending,
+            "resilience": {"flux": flux_backend.status(), "gemini": gemini_backend.status()}}
+    return jsonify(body), 200 if ready else 503
+
 @app.route('/')
 def index():
     return render_template('index.html')
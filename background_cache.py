@@ -0,0 +1,146 @@
+import hashlib
+import logging
+import os
+import random
+import threading
+
+
+class BackgroundCache:
+    """
+    Disk cache of generated backgrounds. Entries are keyed by the normalized prompt,
+    size, step count and seed; each (prompt, size, steps) combination has a fixed pool
+    of seed_pool_size seeds, so repeated requests still vary between a few backgrounds.
+    Least recently used files are deleted once the directory exceeds max_bytes.
+    """
+
+    def __init__(self, directory, max_bytes=1024 * 1024 * 1024, seed_pool_size=4):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.seed_pool_size = seed_pool_size
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        # key -> cached file path, rebuilt from the directory so the cache survives restarts
+        self._index = {}
+        self._size = 0
+        for entry in os.scandir(directory):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                self._index[entry.name.split(".")[0]] = entry.path
+                self._size += entry.stat().st_size
+
+    @staticmethod
+    def normalize_prompt(prompt):
+        return " ".join(prompt.lower().split())
+
+    def seed_pool(self, prompt, width, height, steps):
+        """The fixed seeds used for this prompt and size (derived from the key, so stable across restarts)."""
+        base = f"{self.normalize_prompt(prompt)}|{width}x{height}|{steps}"
+        return [int(hashlib.sha256(f"{base}|{i}".encode()).hexdigest()[:8], 16) for i in range(self.seed_pool_size)]
+
+    def pick_seed(self, prompt, width, height, steps):
+        return random.choice(self.seed_pool(prompt, width, height, steps))
+
+    def key(self, prompt, width, height, steps, seed):
+        raw = f"{self.normalize_prompt(prompt)}|{width}x{height}|{steps}|{seed}"
+        return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+    def any_cached(self, prompt, width, height, steps):
+        """
+        (image bytes, seed) of any cached background in the prompt's seed pool, or None; used when
+        Flux is unavailable. Doesn't count towards hits and misses, which track get's lookups only.
+        """
+        for seed in self.seed_pool(prompt, width, height, steps):
+            data = self._read(self.key(prompt, width, height, steps, seed))
+            if data is not None:
+                return data, seed
+        return None
+
+    def _path(self, key, extension=""):
+        return os.path.join(self.directory, key + extension)
+
+    def get(self, key):
+        """Returns the cached image bytes for key (marking it recently used) or None."""
+        data = self._read(key)
+        with self._lock:
+            if data is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return data
+
+    def _read(self, key):
+        """
+        Bytes of the cached file for key, or None. The file is read outside the lock, so one
+        evicted by a concurrent put after the lookup is a miss rather than an error.
+        """
+        with self._lock:
+            path = self._touch(key)
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _touch(self, key):
+        """Cached path for key with its mtime bumped, or None; call with the lock held."""
+        path = self._index.get(key)
+        if path is None:
+            return None
+        try:
+            os.utime(path)
+            return path
+        except FileNotFoundError:
+            del self._index[key]
+            return None
+
+    def put(self, key, source_path):
+        """Copies a generated image into the cache and returns its bytes."""
+        with open(source_path, "rb") as f:
+            data = f.read()
+        path = self._path(key, os.path.splitext(source_path)[1])
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        with self._lock:
+            old_path = self._index.get(key)
+            if old_path is not None:
+                # replacing an entry (e.g. a re-warmed seed) mustn't count its old file twice
+                try:
+                    self._size -= os.path.getsize(old_path)
+                    if old_path != path:
+                        os.remove(old_path)
+                except FileNotFoundError:
+                    pass
+            os.replace(tmp_path, path)
+            self._index[key] = path
+            self._size += len(data)
+            self._evict(keep=path)
+        return data
+
+    def _evict(self, keep):
+        if self._size <= self.max_bytes:
+            return
+        # mtime doubles as the last-used time (get touches the file)
+        entries = []
+        for key, path in self._index.items():
+            try:
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, key, path))
+            except FileNotFoundError:
+                pass
+        entries.sort()
+        self._size = sum(size for _, size, _, _ in entries)
+        for _, size, key, path in entries:
+            if self._size <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+                self._size -= size
+                del self._index[key]
+            except OSError as e:
+                logging.warning(f"Could not evict cached background {path}: {str(e)}")
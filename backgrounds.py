@@ -0,0 +1,120 @@
+import numpy as np
+from PIL import Image, ImageFilter
+
+from palette import hex_to_rgb
+
+# Backgrounds are computed at 1/DOWNSCALE of the canvas size and upsampled;
+# they are smooth, so the difference isn't visible and it keeps them in the tens of milliseconds
+DOWNSCALE = 4
+
+
+def color_stops(colors):
+    stops = np.array([hex_to_rgb(c) for c in colors] or [(255, 255, 255)], dtype=np.float32)
+    if len(stops) == 1:
+        stops = np.vstack([stops, stops * 0.6])
+    return stops
+
+
+def ramp(stops, t):
+    """Maps values in [0, 1] to colors interpolated between the stops; returns float RGB."""
+    t = np.clip(t, 0, 1) * (len(stops) - 1)
+    index = np.minimum(t.astype(np.int32), len(stops) - 2)
+    fraction = (t - index)[..., None]
+    return stops[index] * (1 - fraction) + stops[index + 1] * fraction
+
+
+def small_size(width, height):
+    return max(2, width // DOWNSCALE), max(2, height // DOWNSCALE)
+
+
+def to_image(pixels, width, height):
+    image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8), "RGB")
+    if image.size != (width, height):
+        image = image.resize((width, height), Image.BILINEAR)
+    return image
+
+
+def linear_gradient(colors, width, height, rng=None):
+    """Diagonal gradient through the given hex colors (also used when no Flux background is available)."""
+    small_width, small_height = small_size(width, height)
+    x = np.linspace(0, 0.5, small_width, dtype=np.float32)
+    y = np.linspace(0, 0.5, small_height, dtype=np.float32)
+    return to_image(ramp(color_stops(colors), y[:, None] + x[None, :]), width, height)
+
+
+def mesh_gradient(colors, width, height, rng):
+    """Soft blend of the palette colors around random anchor points (inverse distance weighting)."""
+    stops = color_stops(colors)
+    small_width, small_height = small_size(width, height)
+    y, x = np.mgrid[0:small_height, 0:small_width].astype(np.float32)
+    x /= small_width
+    y /= small_height * width / height
+    anchors = rng.random((len(stops), 2)).astype(np.float32) * [1, height / width]
+    distances = (x[..., None] - anchors[:, 0]) ** 2 + (y[..., None] - anchors[:, 1]) ** 2
+    weights = 1 / (distances + 1e-3) ** 1.5
+    pixels = weights @ stops / weights.sum(axis=-1, keepdims=True)
+    return to_image(pixels, width, height)
+
+
+def bokeh(colors, width, height, rng, count=36):
+    """Blurred light discs in the palette colors over a darkened mesh gradient."""
+    stops = color_stops(colors)
+    small_width, small_height = small_size(width, height)
+    pixels = np.asarray(mesh_gradient(colors, small_width, small_height, rng), dtype=np.float32) * 0.55
+    for _ in range(count):
+        cx, cy = rng.random() * small_width, rng.random() * small_height
+        radius = (0.03 + rng.random() * 0.12) * min(small_width, small_height)
+        # only the disc's bounding box is touched
+        x0, x1 = max(0, int(cx - radius)), min(small_width, int(cx + radius) + 1)
+        y0, y1 = max(0, int(cy - radius)), min(small_height, int(cy + radius) + 1)
+        if x0 >= x1 or y0 >= y1:
+            continue
+        y, x = np.ogrid[y0:y1, x0:x1]
+        # smooth edge over the outer 15% of the radius
+        coverage = np.clip((radius - np.hypot(x - cx, y - cy)) / (0.15 * radius), 0, 1)
+        pixels[y0:y1, x0:x1] += coverage[..., None] * stops[rng.integers(len(stops))] * (0.25 + 0.35 * rng.random())
+    image = to_image(pixels, small_width, small_height).filter(ImageFilter.GaussianBlur(1))
+    return image.resize((width, height), Image.BILINEAR)
+
+
+def value_noise(width, height, cells, rng):
+    """Smooth noise in [0, 1]: random values on a cells-wide lattice with smoothstep interpolation."""
+    cells_x = max(1, cells)
+    cells_y = max(1, round(cells * height / width))
+    lattice = rng.random((cells_y + 1, cells_x + 1)).astype(np.float32)
+    gx = np.linspace(0, cells_x, width, endpoint=False, dtype=np.float32)
+    gy = np.linspace(0, cells_y, height, endpoint=False, dtype=np.float32)
+    x0, y0 = gx.astype(np.int32), gy.astype(np.int32)
+    fx, fy = gx - x0, gy - y0
+    fx, fy = fx * fx * (3 - 2 * fx), fy * fy * (3 - 2 * fy)
+    top = lattice[y0][:, x0] * (1 - fx) + lattice[y0][:, x0 + 1] * fx
+    bottom = lattice[y0 + 1][:, x0] * (1 - fx) + lattice[y0 + 1][:, x0 + 1] * fx
+    return top * (1 - fy)[:, None] + bottom * fy[:, None]
+
+
+def noise(colors, width, height, rng, octaves=4):
+    """Perlin-style fractal noise (octaves of value noise) mapped onto the palette."""
+    small_width, small_height = small_size(width, height)
+    total = np.zeros((small_height, small_width), dtype=np.float32)
+    amplitude, norm = 1.0, 0.0
+    for octave in range(octaves):
+        total += value_noise(small_width, small_height, 3 * 2 ** octave, rng) * amplitude
+        norm += amplitude
+        amplitude *= 0.5
+    total /= norm
+    # stretch the contrast so the whole palette shows up
+    low, high = np.percentile(total, (2, 98))
+    return to_image(ramp(color_stops(colors), (total - low) / max(high - low, 1e-6)), width, height)
+
+
+STYLES = {
+    "gradient": linear_gradient,
+    "mesh": mesh_gradient,
+    "bokeh": bokeh,
+    "noise": noise,
+}
+
+
+def render_background(style, colors, width, height, seed=None):
+    """Draws a background of the given style from hex colors; the same seed gives the same image."""
+    return STYLES[style](colors, width, height, np.random.default_rng(seed))
@@ -0,0 +1,248 @@
+"""
+Load benchmark for the banner service. Flux and Gemini are replaced by local stand-ins with
+configurable latency (lognormal, "median_seconds:sigma") and canned outputs, so it runs without
+credentials or network access:
+
+    python benchmark.py --concurrency 1,4,16 --images 1,2,4,8 --requests 24
+
+The app is served by Werkzeug's threaded server on a local port. For each concurrency level
+it drives GET / and POST /generate_banner with every image count, cycling through the
+TEMPLATES resolutions, and reports per-stage p50/p95/p99 (from the Server-Timing header),
+throughput, RSS and response size. --json writes the same numbers for comparing runs.
+"""
+import base64
+import io
+import json
+import logging
+import math
+import os
+import random
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+import numpy as np
+from PIL import Image
+from werkzeug.serving import make_server
+
+import app
+from backgrounds import render_background
+from clients import clients
+
+
+def sample_latency(median, sigma):
+    return random.lognormvariate(math.log(median), sigma) if median > 0 else 0
+
+
+def parse_latency(value):
+    median, _, sigma = value.partition(":")
+    return float(median), float(sigma or 0)
+
+
+class FakeFlux:
+    """Stand-in for the Gradio Flux client: waits a sampled latency and returns a canned WebP per size."""
+
+    def __init__(self, median, sigma, directory):
+        self.median = median
+        self.sigma = sigma
+        self.directory = directory
+        self._paths = {}
+        self._lock = threading.Lock()
+
+    def predict(self, prompt=None, seed=0, randomize_seed=True, width=1024, height=1024, num_inference_steps=4, api_name=None):
+        time.sleep(sample_latency(self.median, self.sigma))
+        return self._background(width, height), seed
+
+    def _background(self, width, height):
+        with self._lock:
+            if (width, height) not in self._paths:
+                path = os.path.join(self.directory, f"flux_{width}x{height}.webp")
+                render_background("bokeh", ["#ff6600", "#3366ff", "#ffee00"], width, height, seed=0).save(path, format="WEBP")
+                self._paths[width, height] = path
+            return self._paths[width, height]
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+        self.usage_metadata = None
+
+
+DESIGN_RESPONSE = json.dumps({
+    "backgroundImage": "abstract shapes",
+    "backgroundColors": ["#ff6600", "#3366ff"],
+    "products": "sneaker, backpack",
+    "mainText": "Summer Sale 50% Off",
+    "secondaryText": "Fresh gear for sunny days",
+    "textColors": {"mainText": "#ffffff", "secondaryText": "#ffee00"},
+})
+
+
+class FakeModel:
+    def __init__(self, gemini):
+        self.gemini = gemini
+
+    def generate_content(self, contents):
+        time.sleep(sample_latency(self.gemini.median, self.gemini.sigma))
+        first = contents[0] if isinstance(contents, list) else contents
+        if "Create a banner design" in str(first):
+            return FakeResponse(DESIGN_RESPONSE)
+        # template generation: no canned layout fits every request, so the app falls back to its solver
+        return FakeResponse("{}")
+
+
+class FakeGemini:
+    """Stand-in for the google.generativeai module as used through clients.gemini_model."""
+
+    def __init__(self, median, sigma):
+        self.median = median
+        self.sigma = sigma
+
+    def GenerativeModel(self, model_name=None, generation_config=None):
+        return FakeModel(self)
+
+
+def product_images(count, size):
+    """Noisy JPEG product shots as data URLs, so decode and hashing see realistic sizes."""
+    rng = np.random.default_rng(0)
+    images = []
+    for i in range(count):
+        width, height = (size, int(size * 0.75)) if i % 2 else (int(size * 0.75), size)
+        pixels = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels, "RGB").save(buffer, format="JPEG", quality=85)
+        images.append("data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode("ascii"))
+    return images
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))]
+
+
+def parse_server_timing(header):
+    timings = {}
+    for part in (header or "").split(","):
+        name, _, duration = part.strip().partition(";dur=")
+        if name and duration:
+            timings[name] = float(duration)
+    return timings
+
+
+def rss_bytes():
+    """Current resident set size (Linux), falling back to the peak RSS elsewhere."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def send(url, body=None):
+    """One request; returns (status, seconds, response bytes, Server-Timing stages)."""
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"} if data else {})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=300) as response:
+            payload = response.read()
+            status, header = response.status, response.headers.get("Server-Timing")
+    except urllib.error.HTTPError as e:
+        payload, status, header = e.read(), e.code, None
+    return status, time.perf_counter() - start, len(payload), parse_server_timing(header)
+
+
+def run_scenario(url, bodies, concurrency):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda body: send(url, body), bodies))
+    elapsed = time.perf_counter() - start
+    ok = [r for r in results if r[0] == 200]
+    stages = {}
+    for _, _, _, timings in ok:
+        for name, duration in timings.items():
+            stages.setdefault(name, []).append(duration)
+    latencies = [seconds * 1000 for _, seconds, _, _ in ok]
+    return {
+        "requests": len(results),
+        "errors": {str(status): sum(1 for r in results if r[0] == status) for status in {r[0] for r in results if r[0] != 200}},
+        "throughput": round(len(ok) / elapsed, 2) if elapsed else None,
+        "latency_ms": {f"p{q}": percentile(latencies, q) for q in (50, 95, 99)},
+        "stages_ms": {name: {f"p{q}": percentile(values, q) for q in (50, 95, 99)} for name, values in stages.items()},
+        "response_bytes": round(sum(size for _, _, size, _ in ok) / len(ok)) if ok else 0,
+        "rss_mb": round(rss_bytes() / 1024 / 1024, 1),
+    }
+
+
+def print_result(label, result):
+    latency = result["latency_ms"]
+    if latency["p50"] is None:
+        print(f"{label}: no successful requests, errors {result['errors']}")
+        return
+    print(f"{label}: {result['throughput']} req/s, p50/p95/p99 {latency['p50']:.0f}/{latency['p95']:.0f}/{latency['p99']:.0f} ms, "
+          f"{result['response_bytes']} B/response, RSS {result['rss_mb']} MB" + (f", errors {result['errors']}" if result['errors'] else ""))
+    for name, stage in result["stages_ms"].items():
+        print(f"    {name:<24} {stage['p50']:>9.1f} {stage['p95']:>9.1f} {stage['p99']:>9.1f}")
+
+
+@click.command()
+@click.option('--concurrency', default="1,4,16", help='Comma-separated concurrency levels')
+@click.option('--images', 'image_counts', default="1,2,4,8", help='Comma-separated product image counts')
+@click.option('--requests', 'num_requests', default=24, help='Requests per concurrency level and image count')
+@click.option('--image-size', default=800, help='Longest edge of the generated product images (px)')
+@click.option('--flux-latency', default="1.5:0.3", help='Fake Flux latency as median_seconds:sigma')
+@click.option('--gemini-latency', default="0.8:0.3", help='Fake Gemini latency as median_seconds:sigma')
+@click.option('--background-mode', default=None, help='background_mode sent with each request')
+@click.option('--json', 'json_path', default=None, help='Also write the results to this JSON file')
+def main(concurrency, image_counts, num_requests, image_size, flux_latency, gemini_latency, background_mode, json_path):
+    """Runs the load benchmark against an in-process server with fake Flux and Gemini backends."""
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    clients.override("flux", FakeFlux(*parse_latency(flux_latency), tempfile.mkdtemp(prefix="banner-bench-")))
+    clients.override("gemini", FakeGemini(*parse_latency(gemini_latency)))
+
+    server = make_server("127.0.0.1", 0, app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    resolutions = sorted({template['resolution'] for template in app.TEMPLATES})
+    counts = [int(n) for n in image_counts.split(",")]
+    images = product_images(max(counts), image_size)
+    results = []
+    print(f"Resolutions: {', '.join(resolutions)}; stages are p50/p95/p99 in ms")
+    try:
+        for level in [int(c) for c in concurrency.split(",")]:
+            result = run_scenario(f"{base_url}/", [None] * num_requests, level)
+            print_result(f"GET / concurrency={level}", result)
+            results.append({"endpoint": "/", "concurrency": level, **result})
+            for count in counts:
+                bodies = [{
+                    # distinct promotions, so request coalescing doesn't merge the load
+                    "promotion": f"Summer sale {level}-{count}-{i}",
+                    "theme": "summer",
+                    "resolution": resolutions[i % len(resolutions)],
+                    "color_palette": ["#ff6600", "#3366ff", "#ffee00"],
+                    "images": images[:count],
+                    **({"background_mode": background_mode} if background_mode else {}),
+                } for i in range(num_requests)]
+                result = run_scenario(f"{base_url}/generate_banner", bodies, level)
+                print_result(f"POST /generate_banner concurrency={level} images={count}", result)
+                results.append({"endpoint": "/generate_banner", "concurrency": level, "images": count, **result})
+    finally:
+        server.shutdown()
+
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {json_path}")
+
+
+if __name__ == '__main__':
+    main()
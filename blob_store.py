@@ -0,0 +1,88 @@
+import hashlib
+import mimetypes
+import os
+import threading
+from collections import OrderedDict
+
+EXTENSIONS = {
+    "image/png": "png",
+    "image/jpeg": "jpg",
+    "image/webp": "webp",
+    "image/gif": "gif",
+}
+
+
+def asset_id_for(data, mime_type):
+    """Content address of a blob: sha256 prefix plus an extension that encodes its mime type."""
+    digest = hashlib.sha256(data).hexdigest()[:32]
+    return f"{digest}.{EXTENSIONS.get(mime_type, 'bin')}"
+
+
+def mime_type_for(asset_id):
+    return mimetypes.guess_type(asset_id)[0] or "application/octet-stream"
+
+
+def is_valid_asset_id(asset_id):
+    digest, _, extension = asset_id.partition(".")
+    return len(digest) == 32 and all(c in "0123456789abcdef" for c in digest) and extension.isalnum()
+
+
+class MemoryBlobStore:
+    """Content-addressed blobs kept in memory, evicted least recently used past max_bytes."""
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._blobs = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def put(self, data, mime_type):
+        asset_id = asset_id_for(data, mime_type)
+        with self._lock:
+            if asset_id in self._blobs:
+                self._blobs.move_to_end(asset_id)
+                return asset_id
+            self._blobs[asset_id] = data
+            self._size += len(data)
+            while self._size > self.max_bytes and len(self._blobs) > 1:
+                _, evicted = self._blobs.popitem(last=False)
+                self._size -= len(evicted)
+        return asset_id
+
+    def get(self, asset_id):
+        with self._lock:
+            data = self._blobs.get(asset_id)
+            if data is not None:
+                self._blobs.move_to_end(asset_id)
+            return data
+
+
+class FileBlobStore:
+    """Content-addressed blobs stored as files named by their asset id under `directory`."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, asset_id):
+        return os.path.join(self.directory, asset_id)
+
+    def put(self, data, mime_type):
+        asset_id = asset_id_for(data, mime_type)
+        path = self._path(asset_id)
+        if not os.path.exists(path):
+            # Write then rename so readers never see a partially written blob
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return asset_id
+
+    def get(self, asset_id):
+        if not is_valid_asset_id(asset_id):
+            return None
+        try:
+            with open(self._path(asset_id), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
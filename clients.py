@@ -0,0 +1,131 @@
+import json
+import logging
+import os
+import threading
+import time
+
+FLUX_SPACE = "black-forest-labs/FLUX.1-schnell"
+
+
+def create_flux_client():
+    # Imported here so that starting the web process doesn't pay for gradio/huggingface imports
+    from gradio_client import Client
+    from huggingface_hub import login
+    hf_token = os.environ.get("HF_TOKEN")
+    if hf_token:
+        login(token=hf_token)
+    return Client(FLUX_SPACE, hf_token=hf_token)
+
+
+def create_gemini():
+    import google.generativeai as genai
+    genai.configure(api_key=os.environ.get("GEMINI_API_KEY"))
+    return genai
+
+
+class ClientUnavailable(Exception):
+    """Raised while a client that failed to initialize waits out its retry delay."""
+
+
+class ClientProvider:
+    """
+    Creates remote clients lazily, on first use, and shares them for the life of the process.
+    Factories are registered by name; override() swaps in a ready-made instance (e.g. a local
+    stand-in for tests or benchmarks) without touching the network.
+
+    Each client is initialized under its own lock, so a slow Flux login doesn't hold up Gemini.
+    After a failed initialization, get() raises ClientUnavailable for retry_after seconds,
+    doubling with each further failure up to max_retry_after, instead of retrying per request.
+    """
+
+    def __init__(self, retry_after=5, max_retry_after=300):
+        self.retry_after = retry_after
+        self.max_retry_after = max_retry_after
+        self._factories = {}
+        self._instances = {}
+        self._errors = {}
+        self._failures = {}  # name -> (consecutive failures, monotonic time of the next attempt)
+        self._init_locks = {}
+        self._models = {}
+        self._lock = threading.Lock()
+        self._models_lock = threading.Lock()
+
+    def register(self, name, factory):
+        self._factories[name] = factory
+        self._init_locks[name] = threading.Lock()
+
+    def override(self, name, instance):
+        with self._lock:
+            self._instances[name] = instance
+            self._errors.pop(name, None)
+            self._failures.pop(name, None)
+        with self._models_lock:
+            self._models.clear()
+
+    def get(self, name):
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._init_locks[name]:
+            if name in self._instances:
+                return self._instances[name]
+            failures, next_attempt = self._failures.get(name, (0, 0))
+            if time.monotonic() < next_attempt:
+                raise ClientUnavailable(f"{name} client failed to initialize ({self._errors[name]}), "
+                                        f"retrying in {next_attempt - time.monotonic():.0f}s")
+            start = time.perf_counter()
+            try:
+                instance = self._factories[name]()
+            except Exception as e:
+                delay = min(self.retry_after * 2 ** failures, self.max_retry_after)
+                with self._lock:
+                    self._errors[name] = str(e)
+                    self._failures[name] = (failures + 1, time.monotonic() + delay)
+                raise
+            with self._lock:
+                self._instances[name] = instance
+                self._errors.pop(name, None)
+                self._failures.pop(name, None)
+            logging.info(f"Initialized {name} client in {time.perf_counter() - start:.2f}s")
+            return instance
+
+    def gemini_model(self, model_name, generation_config=None):
+        """A GenerativeModel per (model, config), reused across requests instead of built per call."""
+        key = (model_name, json.dumps(generation_config, sort_keys=True))
+        model = self._models.get(key)
+        if model is None:
+            genai = self.get("gemini")
+            with self._models_lock:
+                model = self._models.get(key)
+                if model is None:
+                    model = genai.GenerativeModel(model_name=model_name, generation_config=generation_config)
+                    self._models[key] = model
+        return model
+
+    def status(self):
+        """Per backend: "ready", "error: ..." or "not initialized" (lazy clients are created on first use)."""
+        statuses = {}
+        for name in self._factories:
+            if name in self._instances:
+                statuses[name] = "ready"
+            elif name in self._errors:
+                statuses[name] = f"error: {self._errors[name]}"
+            else:
+                statuses[name] = "not initialized"
+        return statuses
+
+    def warm_up(self, names=None):
+        """Initializes the given (default: all) clients now; failures are logged and kept in status()."""
+        for name in names or list(self._factories):
+            try:
+                self.get(name)
+            except Exception as e:
+                logging.error(f"Warm-up of {name} client failed: {str(e)}")
+
+
+clients = ClientProvider(
+    retry_after=float(os.environ.get("CLIENT_RETRY_SECONDS", 5)),
+    max_retry_after=float(os.environ.get("CLIENT_MAX_RETRY_SECONDS", 300)),
+)
+clients.register("flux", create_flux_client)
+clients.register("gemini", create_gemini)
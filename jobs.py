@@ -0,0 +1,97 @@
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while max_pending jobs are already queued or running."""
+
+
+class Job:
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.timings = {}
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.done = threading.Event()
+
+    def to_dict(self, include_result=True):
+        data = {
+            "job_id": self.id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if self.status == "done":
+            data["timings"] = self.timings
+            if include_result:
+                data["result"] = self.result
+        elif self.status == "failed":
+            data["error"] = self.error
+        return data
+
+
+class JobQueue:
+    """
+    Runs jobs on a bounded worker pool. At most max_pending jobs may be queued or running;
+    beyond that submit raises QueueFullError so callers can shed load. Finished jobs are
+    kept for result_ttl seconds for polling and then dropped.
+    """
+
+    def __init__(self, max_workers=4, max_pending=32, result_ttl=600):
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="banner-job")
+        self._jobs = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def submit(self, func, *args, **kwargs):
+        """Queues func(*args, timings=job.timings, **kwargs) and returns the Job."""
+        with self._lock:
+            self._prune()
+            if self._pending >= self.max_pending:
+                raise QueueFullError(f"{self._pending} jobs already pending")
+            job = Job()
+            self._jobs[job.id] = job
+            self._pending += 1
+        self._executor.submit(self._run, job, func, args, kwargs)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            self._prune()
+            return self._jobs.get(job_id)
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def _run(self, job, func, args, kwargs):
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            job.result = func(*args, timings=job.timings, **kwargs)
+            job.status = "done"
+        except Exception as e:
+            logging.error(f"Job {job.id} failed: {str(e)}")
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                self._pending -= 1
+            job.done.set()
+
+    def _prune(self):
+        cutoff = time.time() - self.result_ttl
+        expired = [job_id for job_id, job in self._jobs.items() if job.finished_at and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
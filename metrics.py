@@ -0,0 +1,161 @@
+import bisect
+import threading
+import time
+import uuid
+from collections import deque
+
+# seconds, from a cache hit to a slow Flux call
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+# bytes, 1KB to 64MB
+SIZE_BUCKETS = tuple(1024 * 4 ** i for i in range(9))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{_labels(self.labelnames, key)} {_number(value)}"
+
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last one is +Inf), sum]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0])
+            counts[0][index] += 1
+            counts[1] += value
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            values = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket{_labels(self.labelnames, key, [('le', _number(bound))])} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}"
+
+
+class CallbackMetric:
+    """A counter or gauge whose values are read at scrape time from func() -> {label values tuple: value}."""
+
+    def __init__(self, name, help_text, metric_type, labelnames, func):
+        self.name = name
+        self.help = help_text
+        self.type = metric_type
+        self.labelnames = tuple(labelnames)
+        self.func = func
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.type}"
+        for key, value in self.func().items():
+            yield f"{self.name}{_labels(self.labelnames, key)} {_number(value)}"
+
+
+class Registry:
+    """Metrics of one process, rendered in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def callback(self, name, help_text, metric_type, labelnames, func):
+        return self._register(CallbackMetric(name, help_text, metric_type, labelnames, func))
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def exposition(self):
+        return "\n".join(line for metric in self._metrics for line in metric.collect()) + "\n"
+
+
+class RequestTrace(dict):
+    """
+    Stage timings dict (name -> ms, as used for Server-Timing) that also keeps a span per stage
+    with its start offset and thread, so the stages of one request can be laid out on a timeline.
+    """
+
+    def __init__(self, name, trace_id=None):
+        super().__init__()
+        self.name = name
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.spans = []
+
+    def add_span(self, name, start, duration):
+        self.spans.append({
+            "name": name,
+            "start_ms": round((start - self._start) * 1000, 1),
+            "duration_ms": round(duration * 1000, 1),
+            "thread": threading.current_thread().name,
+        })
+
+    def to_dict(self):
+        return {"trace_id": self.trace_id, "name": self.name, "started_at": self.started_at,
+                "spans": sorted(self.spans, key=lambda span: span["start_ms"])}
+
+
+class TraceBuffer:
+    """The most recent finished traces, for GET /traces."""
+
+    def __init__(self, size=100):
+        self._traces = deque(maxlen=size)
+
+    def add(self, trace):
+        self._traces.append(trace.to_dict())
+
+    def recent(self):
+        return list(self._traces)
@@ -0,0 +1,81 @@
+import numpy as np
+from PIL import Image
+
+# Longest edge the background is reduced to before any color analysis
+ANALYSIS_EDGE = 256
+
+
+def hex_to_rgb(value):
+    value = value.lstrip('#')
+    if len(value) == 3:
+        value = "".join(c * 2 for c in value)
+    return tuple(int(value[i:i + 2], 16) for i in (0, 2, 4))
+
+
+def rgb_to_hex(rgb):
+    return "#{:02x}{:02x}{:02x}".format(*(int(c) for c in rgb))
+
+
+def relative_luminance(rgb):
+    """WCAG relative luminance of an (..., 3) array of 0-255 sRGB values."""
+    srgb = np.asarray(rgb, dtype=np.float32) / 255.0
+    linear = np.where(srgb <= 0.03928, srgb / 12.92, ((srgb + 0.055) / 1.055) ** 2.4)
+    return linear @ np.array([0.2126, 0.7152, 0.0722], dtype=np.float32)
+
+
+def contrast_ratio(luminance_a, luminance_b):
+    lighter = np.maximum(luminance_a, luminance_b)
+    darker = np.minimum(luminance_a, luminance_b)
+    return (lighter + 0.05) / (darker + 0.05)
+
+
+def required_contrast(font_size, bold):
+    """WCAG AA: 3:1 for large text (24px, or 18.66px bold), 4.5:1 otherwise."""
+    return 3.0 if font_size >= 24 or (bold and font_size >= 18.66) else 4.5
+
+
+def analysis_image(image):
+    """RGB copy of the background reduced to ANALYSIS_EDGE, shared by the palette and contrast checks."""
+    small = image.convert("RGB")
+    small.thumbnail((ANALYSIS_EDGE, ANALYSIS_EDGE), Image.BILINEAR)
+    return small
+
+
+def extract_palette(small, k=5):
+    """Dominant colors of an analysis image by median-cut quantization, most frequent first."""
+    quantized = small.quantize(colors=k, method=Image.Quantize.MEDIANCUT)
+    counts = np.bincount(np.asarray(quantized).ravel(), minlength=k)
+    colors = np.asarray(quantized.getpalette()[:3 * k]).reshape(-1, 3)
+    order = np.argsort(counts)[::-1]
+    return [rgb_to_hex(colors[i]) for i in order if counts[i] > 0]
+
+
+def region_luminance(small, box):
+    """
+    Luminance of the pixels under a box given in fractions of the canvas (x0, y0, x1, y1).
+    Returns the 10th and 90th percentiles so a few stray pixels don't decide the color.
+    """
+    width, height = small.size
+    x0, y0, x1, y1 = box
+    left, right = int(max(0.0, x0) * width), int(np.ceil(min(1.0, x1) * width))
+    top, bottom = int(max(0.0, y0) * height), int(np.ceil(min(1.0, y1) * height))
+    pixels = np.asarray(small)[top:max(bottom, top + 1), left:max(right, left + 1)].reshape(-1, 3)
+    if pixels.size == 0:
+        pixels = np.asarray(small).reshape(-1, 3)
+    luminance = relative_luminance(pixels)
+    return float(np.percentile(luminance, 10)), float(np.percentile(luminance, 90))
+
+
+def choose_text_color(candidates, luminance_range, min_ratio, avoid=None):
+    """
+    Picks the first candidate hex color whose contrast against both ends of luminance_range
+    meets min_ratio (skipping `avoid`), falling back to the highest-contrast candidate.
+    """
+    candidates = [c for c in dict.fromkeys(candidates) if c]
+    luminance = relative_luminance([hex_to_rgb(c) for c in candidates])
+    low, high = luminance_range
+    worst = np.minimum(contrast_ratio(luminance, low), contrast_ratio(luminance, high))
+    for color, ratio in zip(candidates, worst):
+        if ratio >= min_ratio and color != avoid:
+            return color
+    return candidates[int(np.argmax(worst))]
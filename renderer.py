@@ -0,0 +1,223 @@
+import base64
+import io
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from PIL import Image, ImageDraw, ImageFont
+
+# Windows font file names for the families used in TEMPLATES: (regular, bold)
+FONT_FILES = {
+    "arial": ("arial.ttf", "arialbd.ttf"),
+    "arial black": ("ariblk.ttf", "ariblk.ttf"),
+    "gill sans mt": ("GIL_____.TTF", "GILB____.TTF"),
+    "monotype corsiva": ("MTCORSVA.TTF", "MTCORSVA.TTF"),
+    "segoe print": ("segoepr.ttf", "segoeprb.ttf"),
+    "trebuchet ms": ("trebuc.ttf", "trebucbd.ttf"),
+    "verdana": ("verdana.ttf", "verdanab.ttf"),
+}
+FALLBACK_FONT_FILES = ("DejaVuSans.ttf", "DejaVuSans-Bold.ttf")
+FONT_DIRS = [d for d in os.environ.get("FONT_DIRS", "").split(os.pathsep) if d] + [
+    "fonts",
+    "/usr/share/fonts",
+    "/usr/local/share/fonts",
+    "/Library/Fonts",
+    "C:\\Windows\\Fonts",
+]
+# fabric.Text's default lineHeight
+FABRIC_LINE_HEIGHT = 1.16
+
+OUTPUT_FORMATS = {"png": "PNG", "webp": "WEBP", "jpeg": "JPEG", "jpg": "JPEG"}
+# Largest canvas (and largest scaled product image) rendered, in pixels; 16M is 4000x4000
+MAX_CANVAS_PIXELS = int(os.environ.get("MAX_CANVAS_PIXELS", 16_000_000))
+# Largest image decoded, the same limit the app applies to uploads
+MAX_SOURCE_PIXELS = int(os.environ.get("IMAGE_MAX_PIXELS", 40_000_000))
+
+
+@lru_cache(maxsize=1)
+def font_file_index():
+    """Maps lower-cased font file names to paths across FONT_DIRS (walked once per process)."""
+    index = {}
+    for font_dir in FONT_DIRS:
+        for root, _, files in os.walk(font_dir):
+            for name in files:
+                if name.lower().endswith((".ttf", ".otf", ".ttc")):
+                    index.setdefault(name.lower(), os.path.join(root, name))
+    return index
+
+
+@lru_cache(maxsize=128)
+def load_font(family, bold, size):
+    index = font_file_index()
+    candidates = []
+    if family and family.lower() in FONT_FILES:
+        candidates.append(FONT_FILES[family.lower()][1 if bold else 0])
+    candidates.append(FALLBACK_FONT_FILES[1 if bold else 0])
+    for name in candidates:
+        path = index.get(name.lower())
+        if path:
+            return ImageFont.truetype(path, size)
+    logging.warning(f"No font file found for {family!r}, using Pillow's default font")
+    return ImageFont.load_default(size)
+
+
+@lru_cache(maxsize=128)
+def font_metrics(family, bold, size):
+    """Cached (ascent, descent) of a font, used to place text like fabric.Text does."""
+    return load_font(family, bold, size).getmetrics()
+
+
+class ImageCache:
+    """
+    LRU cache of decoded images bounded by their total size in bytes (pixels plus the encoded
+    key), since a single decoded photo can take tens of megabytes.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._images = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._images.get(key)
+            if entry is None:
+                return None
+            self._images.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, image):
+        size = image.width * image.height * len(image.getbands()) + len(key[0])
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._images:
+                return
+            self._images[key] = (image, size)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (_, evicted_size) = self._images.popitem(last=False)
+                self._size -= evicted_size
+
+
+# Decoded and resized images shared by all renders in the process
+image_cache = ImageCache(int(os.environ.get("RENDER_CACHE_BYTES", 256 * 1024 * 1024)))
+
+
+def decode_image(data):
+    image = image_cache.get((data,))
+    if image is not None:
+        return image
+    image = Image.open(io.BytesIO(data))
+    # checked from the header, before any pixel data is decoded
+    if image.width * image.height > MAX_SOURCE_PIXELS:
+        raise ValueError(f"Image of {image.width}x{image.height} exceeds {MAX_SOURCE_PIXELS} pixels")
+    image.load()
+    image = image.convert("RGBA")
+    image_cache.put((data,), image)
+    return image
+
+
+def resized_image(data, width, height):
+    """Decoded and resized image, cached so repeated products and backgrounds are only resampled once."""
+    image = decode_image(data)
+    if image.size == (width, height):
+        return image
+    resized = image_cache.get((data, width, height))
+    if resized is None:
+        resized = image.resize((width, height), Image.LANCZOS)
+        image_cache.put((data, width, height), resized)
+    return resized
+
+
+def data_url_bytes(src):
+    return base64.b64decode(src.split(",", 1)[1])
+
+
+def check_canvas_size(width, height):
+    """Raises ValueError unless width x height is a canvas of at most MAX_CANVAS_PIXELS."""
+    if width <= 0 or height <= 0 or width * height > MAX_CANVAS_PIXELS:
+        raise ValueError(f"Canvas of {width}x{height} must be positive and at most {MAX_CANVAS_PIXELS} pixels")
+
+
+def render_banner(template, assets=None, output_format="png", quality=90):
+    """
+    Renders a banner Template (as returned by generate_banner) to encoded image bytes.
+    Geometry follows the editor in templates/index.html: left/top/bottom are percentages of
+    the canvas, image width/height are percentages of the image's natural size, and text is
+    positioned by its font size. `assets` maps image srcs to bytes for srcs that are not
+    data URLs (e.g. /assets/<id>). Raises ValueError for an unsupported format or a canvas,
+    image or line of text over MAX_CANVAS_PIXELS, before it is drawn.
+    """
+    pil_format = OUTPUT_FORMATS.get(output_format.lower())
+    if pil_format is None:
+        raise ValueError(f"Unsupported output format: {output_format}")
+    assets = assets or {}
+    canvas_width, canvas_height = template.width, template.height
+    check_canvas_size(canvas_width, canvas_height)
+    canvas = Image.new("RGBA", (canvas_width, canvas_height), (255, 255, 255, 255))
+    draw = ImageDraw.Draw(canvas)
+
+    for obj in template.objects:
+        if obj.type == 'image':
+            src = obj.src
+            data = assets.get(src)
+            if data is None and src and src.startswith("data:"):
+                data = data_url_bytes(src)
+            if data is None:
+                logging.warning(f"Skipping image without data: {str(src)[:64]}")
+                continue
+            natural_width, natural_height = decode_image(data).size
+            width = max(1, round(natural_width * obj.width / 100))
+            height = max(1, round(natural_height * obj.height / 100))
+            if width * height > MAX_CANVAS_PIXELS:
+                raise ValueError(f"Image scaled to {width}x{height} exceeds {MAX_CANVAS_PIXELS} pixels")
+            left = round(obj.left * canvas_width / 100)
+            if obj.top is not None:
+                top = round(obj.top * canvas_height / 100)
+            elif obj.bottom is not None:
+                top = round(canvas_height - obj.bottom * canvas_height / 100 - height)
+            else:
+                top = 0
+            image = resized_image(data, width, height)
+            canvas.paste(image, (left, top), image)
+        elif obj.type == 'text' and obj.text:
+            bold = obj.font_weight == 'bold'
+            size = int(obj.font_size)
+            font = load_font(obj.font_family, bold, size)
+            # Pillow rasterizes the whole line into one mask, even the part off the canvas
+            text_left, text_top, text_right, text_bottom = draw.textbbox((0, 0), obj.text, font=font)
+            if (text_right - text_left) * (text_bottom - text_top) > MAX_CANVAS_PIXELS:
+                raise ValueError(f"Text of {len(obj.text)} characters at fontSize {size} exceeds {MAX_CANVAS_PIXELS} pixels")
+            left = obj.left * canvas_width / 100
+            if obj.top is not None:
+                top = obj.top * canvas_height / 100
+            elif obj.bottom is not None:
+                top = canvas_height - obj.bottom * canvas_height / 100 - size
+            else:
+                top = 0
+            # fabric centres the glyphs in a line box of lineHeight * fontSize; Pillow draws from the ascender line
+            ascent, descent = font_metrics(obj.font_family, bold, size)
+            top += (FABRIC_LINE_HEIGHT * size - (ascent + descent)) / 2
+            draw.text((left, top), obj.text, font=font, fill=obj.fill or "#000000")
+
+    output = canvas.convert("RGB") if pil_format == "JPEG" else canvas
+    buffer = io.BytesIO()
+    output.save(buffer, format=pil_format, quality=quality)
+    return buffer.getvalue()
+
+
+def render_many(jobs, processes=0, output_format="png", quality=90):
+    """
+    Renders (template, assets) pairs and returns the encoded images in order. With processes > 0
+    the work is spread over a process pool, each worker keeping its own font and image caches.
+    """
+    if processes <= 0:
+        return [render_banner(template, assets, output_format, quality) for template, assets in jobs]
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = [pool.submit(render_banner, template, assets, output_format, quality) for template, assets in jobs]
+        return [future.result() for future in futures]
@@ -0,0 +1,192 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class Overloaded(Exception):
+    """Raised instead of queueing when there is no capacity left, so callers fail fast or degrade."""
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the backend while its circuit breaker is open."""
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a backend call (including retries and hedges) runs past its deadline."""
+
+
+class AdmissionLimit:
+    """Caps concurrent work; acquire (or entering) raises Overloaded right away when all slots are taken."""
+
+    def __init__(self, max_concurrent):
+        self.max_concurrent = max_concurrent
+        self._semaphore = threading.BoundedSemaphore(max_concurrent)
+
+    def acquire(self):
+        if not self._semaphore.acquire(blocking=False):
+            raise Overloaded(f"More than {self.max_concurrent} generations in progress")
+
+    def release(self):
+        self._semaphore.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit that adapts to observed latency (AIMD): each call that succeeds within
+    target_latency raises the limit by 1/limit, each slow or failed call cuts it by a quarter.
+    acquire waits at most max_wait for a free slot and then raises Overloaded.
+    """
+
+    def __init__(self, initial, min_limit, max_limit, target_latency, max_wait):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.max_wait = max_wait
+        self.limit = float(min(max(initial, min_limit), max_limit))
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, max_wait=None):
+        max_wait = self.max_wait if max_wait is None else max_wait
+        with self._condition:
+            if not self._condition.wait_for(lambda: self.in_flight < int(self.limit), timeout=max_wait):
+                raise Overloaded(f"{self.in_flight} calls in flight, limit {int(self.limit)}")
+            self.in_flight += 1
+
+    def release(self, latency, ok):
+        with self._condition:
+            self.in_flight -= 1
+            if ok and latency <= self.target_latency:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            else:
+                self.limit = max(self.min_limit, self.limit * 0.75)
+            self._condition.notify_all()
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures and rejects calls for reset_timeout
+    seconds. After that a single trial call is let through (half-open): success closes the
+    circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self._opened_at = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                # restarting the clock means another trial goes out if this one never reports back
+                self.state = "half_open"
+                self._opened_at = time.monotonic()
+                return True
+            return False
+
+    def record(self, ok):
+        with self._lock:
+            if ok:
+                self.state = "closed"
+                self.failures = 0
+                return
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+
+class Backend:
+    """
+    Wraps calls to one remote backend with a circuit breaker, an adaptive concurrency limit,
+    an overall deadline, retries with full-jitter exponential backoff and an optional hedge:
+    when an attempt hasn't answered after hedge_after seconds a second one is started and the
+    first success wins. Calls run on the backend's own threads, so a call that outlives its
+    deadline keeps its slot until it actually returns and can't pile up threads elsewhere.
+    """
+
+    def __init__(self, name, limiter, breaker, timeout=60, retries=1, backoff=0.5, hedge_after=0):
+        self.name = name
+        self.limiter = limiter
+        self.breaker = breaker
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.hedge_after = hedge_after
+        # moving average of successful call durations (seconds), None until the first one
+        self.latency = None
+        self._executor = ThreadPoolExecutor(max_workers=limiter.max_limit, thread_name_prefix=f"{name}-call")
+
+    def call(self, func, *args, **kwargs):
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        deadline = time.monotonic() + self.timeout
+        for attempt in range(self.retries + 1):
+            try:
+                result = self._attempt(func, args, kwargs, deadline)
+            except Overloaded:
+                # not the backend's fault; don't count it against the circuit
+                raise
+            except Exception as e:
+                remaining = deadline - time.monotonic()
+                if attempt == self.retries or remaining <= 0 or isinstance(e, DeadlineExceeded):
+                    self.breaker.record(False)
+                    raise
+                delay = min(remaining, random.uniform(0, self.backoff * 2 ** attempt))
+                logging.warning(f"{self.name} call failed ({str(e)}), retrying in {delay:.2f}s")
+                time.sleep(delay)
+            else:
+                self.breaker.record(True)
+                return result
+
+    def status(self):
+        return {"circuit": self.breaker.state, "limit": int(self.limiter.limit), "in_flight": self.limiter.in_flight,
+                "latency": None if self.latency is None else round(self.latency, 3)}
+
+    def _submit(self, func, args, kwargs, max_wait=None):
+        self.limiter.acquire(max_wait)
+        start = time.monotonic()
+        future = self._executor.submit(func, *args, **kwargs)
+        future.add_done_callback(lambda f: self._finished(time.monotonic() - start, f.exception() is None))
+        return future
+
+    def _finished(self, latency, ok):
+        self.limiter.release(latency, ok)
+        if ok:
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+
+    def _attempt(self, func, args, kwargs, deadline):
+        futures = [self._submit(func, args, kwargs)]
+        if self.hedge_after:
+            done, _ = wait(futures, timeout=min(self.hedge_after, max(0, deadline - time.monotonic())))
+            if not done and time.monotonic() < deadline:
+                try:
+                    # a hedge is only worth sending when a slot is free right now
+                    futures.append(self._submit(func, args, kwargs, max_wait=0))
+                except Overloaded:
+                    pass
+        error = None
+        while futures:
+            done, _ = wait(futures, timeout=max(0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                raise DeadlineExceeded(f"{self.name} call exceeded {self.timeout}s")
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+                futures.remove(future)
+        raise error
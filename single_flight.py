@@ -0,0 +1,63 @@
+import threading
+import time
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.finished_at = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller runs the function and the
+    others wait for it and share its result (or exception). Successful results are kept for
+    result_ttl seconds, so duplicates that arrive just after it finished are answered too.
+    Shared results must be treated as read-only.
+    """
+
+    def __init__(self, result_ttl=10):
+        self.result_ttl = result_ttl
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.shared = 0
+
+    def do(self, key, func, *args, **kwargs):
+        """Returns (result, shared), where shared is False only for the caller that ran func."""
+        with self._lock:
+            self._prune()
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self.executed += 1
+            else:
+                self.shared += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = func(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+            with self._lock:
+                # failures are not cached: the next request tries again
+                self._calls.pop(key, None)
+            raise
+        finally:
+            call.finished_at = time.monotonic()
+            call.done.set()
+        return call.result, False
+
+    def _prune(self):
+        cutoff = time.monotonic() - self.result_ttl
+        expired = [key for key, call in self._calls.items() if call.finished_at is not None and call.finished_at < cutoff]
+        for key in expired:
+            del self._calls[key]
@@ -0,0 +1,169 @@
+import math
+from collections import namedtuple
+
+from template_schema import percent_value
+
+DEFAULT_FONT_SIZE = 20
+GEOMETRY_FIELDS = ("left", "bottom", "top", "width", "height")
+
+
+def format_percent(value):
+    return f"{round(value, 2):g}%"
+
+
+def _percent(obj, key, default, where):
+    if key not in obj:
+        return default
+    value = percent_value(obj[key])
+    if value is None or not math.isfinite(value):
+        raise ValueError(f"{where}.{key} must be a percentage, got {obj[key]!r}")
+    return value
+
+
+def _string(obj, key, default, where):
+    value = obj.get(key, default)
+    if not isinstance(value, str):
+        raise ValueError(f"{where}.{key} must be a string, got {value!r}")
+    return value
+
+
+def _geometry(obj, where):
+    return {
+        "left": _percent(obj, "left", 0.0, where),
+        "bottom": _percent(obj, "bottom", None, where),
+        "top": _percent(obj, "top", None, where),
+        "width": _percent(obj, "width", 100.0, where),
+        "height": _percent(obj, "height", 100.0, where),
+    }
+
+
+def _geometry_dict(obj):
+    data = {"type": obj.type}
+    for key in GEOMETRY_FIELDS:
+        value = getattr(obj, key)
+        if value is not None:
+            data[key] = format_percent(value)
+    return data
+
+
+class TextObject(namedtuple("TextObject", "left bottom top width height font_size fill font_weight font_style text_align text font_family")):
+    """
+    A text object. Geometry is in percent as floats (left/bottom/top of the canvas, width of the
+    canvas), bottom or top None when absent. Immutable: change fields with _replace.
+    """
+    __slots__ = ()
+    type = "text"
+
+    @classmethod
+    def from_dict(cls, obj, where="object"):
+        font_size = obj.get("fontSize", DEFAULT_FONT_SIZE)
+        if isinstance(font_size, bool) or not isinstance(font_size, (int, float)) or not 0 < font_size < math.inf:
+            raise ValueError(f"{where}.fontSize must be a positive number, got {font_size!r}")
+        return cls(
+            font_size=font_size,
+            fill=_string(obj, "fill", "", where),
+            font_weight=_string(obj, "fontWeight", "normal", where),
+            font_style=_string(obj, "fontStyle", "normal", where),
+            text_align=_string(obj, "textAlign", "left", where),
+            text=_string(obj, "text", "", where),
+            font_family=_string(obj, "fontFamily", "Arial", where),
+            **_geometry(obj, where),
+        )
+
+    def to_dict(self):
+        return {
+            **_geometry_dict(self),
+            "fontSize": self.font_size,
+            "fill": self.fill,
+            "fontWeight": self.font_weight,
+            "fontStyle": self.font_style,
+            "textAlign": self.text_align,
+            "text": self.text,
+            "fontFamily": self.font_family,
+        }
+
+
+class ImageObject(namedtuple("ImageObject", "left bottom top width height src")):
+    """
+    An image object. left/bottom/top are percentages of the canvas, width/height percentages of
+    the image's natural size (see templates/index.html). Immutable: change fields with _replace.
+    """
+    __slots__ = ()
+    type = "image"
+
+    @classmethod
+    def from_dict(cls, obj, where="object"):
+        return cls(src=_string(obj, "src", "", where), **_geometry(obj, where))
+
+    def to_dict(self):
+        return {**_geometry_dict(self), "src": self.src}
+
+
+OBJECT_TYPES = {"text": TextObject, "image": ImageObject}
+
+
+class Template(namedtuple("Template", "resolution width height num_images objects")):
+    """
+    A parsed banner template: the canvas size and a tuple of TextObject and ImageObject records.
+    Templates are parsed and validated once (from_dict) when they are loaded or generated and
+    shared from then on; per-request changes build new records with _replace, so only changed
+    objects are copied. to_dict serializes to the fabric JSON the editor loads.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Parses a fabric JSON template. Unknown keys are dropped; malformed values, and font sizes
+        larger than the canvas height, raise ValueError.
+        """
+        if not isinstance(data, dict) or not isinstance(data.get("objects"), list):
+            raise ValueError("template must be an object with an 'objects' list")
+        try:
+            if "width" in data and "height" in data:
+                width, height = int(data["width"]), int(data["height"])
+            else:
+                width, height = map(int, data["resolution"].split("x"))
+        except (KeyError, TypeError, ValueError, AttributeError):
+            raise ValueError("template needs a 'resolution' like '1360x800' or a 'width' and 'height'")
+        objects = []
+        for i, obj in enumerate(data["objects"]):
+            object_type = OBJECT_TYPES.get(obj.get("type")) if isinstance(obj, dict) else None
+            if object_type is None:
+                raise ValueError(f"objects[{i}] must be an object with type 'text' or 'image'")
+            objects.append(object_type.from_dict(obj, f"objects[{i}]"))
+            # glyphs are rasterized at this size, so it's bounded like the canvas itself
+            if objects[-1].type == "text" and objects[-1].font_size > height:
+                raise ValueError(f"objects[{i}].fontSize must be at most the canvas height ({height}), got {objects[-1].font_size!r}")
+        num_images = data.get("num_images", sum(1 for obj in objects if obj.type == "image"))
+        return cls(data.get("resolution", f"{width}x{height}"), width, height, num_images, tuple(objects))
+
+    def to_dict(self):
+        return {
+            "resolution": self.resolution,
+            "num_images": self.num_images,
+            "width": self.width,
+            "height": self.height,
+            "objects": [obj.to_dict() for obj in self.objects],
+        }
+
+    def rounded(self):
+        """Copy with left, bottom, width and height rounded up to whole percents."""
+        return self._replace(objects=tuple(
+            obj._replace(**{key: math.ceil(getattr(obj, key)) for key in ("left", "bottom", "width", "height") if getattr(obj, key) is not None})
+            for obj in self.objects
+        ))
+
+    def scaled(self, resolution, scale):
+        """
+        Copy for another resolution. Positions are canvas percentages and carry over as-is;
+        font sizes and image sizes (percentages of the image's natural size) are multiplied by scale.
+        """
+        width, height = map(int, resolution.split("x"))
+        objects = []
+        for obj in self.objects:
+            if obj.type == "text":
+                objects.append(obj._replace(font_size=max(1, round(obj.font_size * scale))))
+            else:
+                objects.append(obj._replace(width=round(obj.width * scale, 2), height=round(obj.height * scale, 2)))
+        return self._replace(resolution=resolution, width=width, height=height, objects=tuple(objects))
@@ -0,0 +1,79 @@
+import math
+import random
+
+
+def parse_resolution(resolution):
+    width, height = map(int, resolution.split('x'))
+    return width, height
+
+
+class TemplateRegistry:
+    """
+    Indexes parsed Templates by (resolution, num_images) for O(1) exact lookups and, for
+    resolutions without a template, finds the stored template closest in aspect ratio
+    with the same image count and rescales it to the requested size.
+    """
+
+    def __init__(self, templates, aspect_tolerance=0.1):
+        # aspect_tolerance is the max relative aspect ratio difference accepted for scaling
+        self.aspect_tolerance = aspect_tolerance
+        self._exact = {}
+        self._by_num_images = {}
+        for template in templates:
+            self.add(template)
+
+    def add(self, template):
+        key = (template.resolution, template.num_images)
+        self._exact.setdefault(key, []).append(template)
+        self._by_num_images.setdefault(template.num_images, []).append((template.width, template.height, template))
+
+    def exact(self, resolution, num_images):
+        """Returns a random template registered for exactly this key, or None."""
+        candidates = self._exact.get((resolution, num_images))
+        return random.choice(candidates) if candidates else None
+
+    def nearest(self, resolution, num_images):
+        """
+        Returns (template, scale) for the closest template by aspect ratio (ties broken
+        by size), or None when nothing is within aspect_tolerance.
+        """
+        width, height = parse_resolution(resolution)
+        aspect = width / height
+        best = None
+        best_distance = None
+        for t_width, t_height, template in self._by_num_images.get(num_images, []):
+            aspect_distance = abs(math.log(aspect / (t_width / t_height)))
+            size_distance = abs(math.log((width * height) / (t_width * t_height)))
+            distance = (aspect_distance, size_distance)
+            if best_distance is None or distance < best_distance:
+                best, best_distance = (template, min(width / t_width, height / t_height)), distance
+        if best is None or best_distance[0] > math.log(1 + self.aspect_tolerance):
+            return None
+        return best
+
+    def nearest_k(self, resolution, num_images, k):
+        """
+        The k templates most similar to the request, preferring the same image count, then
+        the closest aspect ratio, then the closest size. Used as few-shot examples.
+        """
+        width, height = parse_resolution(resolution)
+        ranked = []
+        for count, entries in self._by_num_images.items():
+            for t_width, t_height, template in entries:
+                ranked.append((
+                    abs(count - num_images),
+                    abs(math.log((width / height) / (t_width / t_height))),
+                    abs(math.log((width * height) / (t_width * t_height))),
+                    len(ranked),
+                    template,
+                ))
+        ranked.sort(key=lambda entry: entry[:4])
+        return [entry[-1] for entry in ranked[:k]]
+
+    def scaled(self, resolution, num_images):
+        """Returns the nearest template rescaled to `resolution` (see Template.scaled), or None."""
+        match = self.nearest(resolution, num_images)
+        if match is None:
+            return None
+        template, scale = match
+        return template.scaled(resolution, scale)
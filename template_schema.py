@@ -0,0 +1,163 @@
+import json
+import re
+
+TEXT_DEFAULTS = {
+    "fontSize": 20,
+    "fill": "",
+    "fontWeight": "bold",
+    "fontStyle": "",
+    "textAlign": "left",
+    "text": "",
+    "fontFamily": "Arial",
+}
+IMAGE_DEFAULTS = {"src": ""}
+# keys whose values must be strings (fontSize is the only non-string default)
+STRING_KEYS = {key for key, default in {**TEXT_DEFAULTS, **IMAGE_DEFAULTS}.items() if isinstance(default, str)}
+GEOMETRY_KEYS = ("left", "bottom", "width", "height")
+POSITION_KEYS = ("left", "bottom", "top")
+ALLOWED_KEYS = {
+    "text": {"type", "top", *GEOMETRY_KEYS, *TEXT_DEFAULTS},
+    "image": {"type", "top", *GEOMETRY_KEYS, *IMAGE_DEFAULTS},
+}
+# image width/height are percentages of the image's natural size, so they may exceed 100
+MAX_SIZE_PERCENT = 400
+MIN_FONT_SIZE, MAX_FONT_SIZE = 6, 400
+
+TRAILING_COMMA = re.compile(r",\s*([}\]])")
+LEADING_NUMBER = re.compile(r"\s*\d+(?:\.\d+)?")
+
+
+def percent_value(value):
+    """Numeric value of a "NN.NN%" string or number, or None when it isn't one."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value.strip().rstrip('%'))
+        except ValueError:
+            return None
+    return None
+
+
+def template_errors(template, num_images):
+    """
+    Validates a template against the schema the pipeline relies on and returns a list of
+    human-readable problems (empty when valid). The messages are also fed back to Gemini
+    when asking it to correct its output.
+    """
+    if not isinstance(template, dict):
+        return ["template must be a JSON object"]
+    objects = template.get('objects')
+    if not isinstance(objects, list):
+        return ["template must have an 'objects' list"]
+    errors = []
+    image_count = 0
+    font_sizes = []
+    for i, obj in enumerate(objects):
+        if not isinstance(obj, dict) or obj.get('type') not in ALLOWED_KEYS:
+            errors.append(f"objects[{i}] must be an object with type 'text' or 'image'")
+            continue
+        unknown = set(obj) - ALLOWED_KEYS[obj['type']]
+        if unknown:
+            errors.append(f"objects[{i}] has unknown keys {sorted(unknown)}")
+        for key in GEOMETRY_KEYS:
+            value = percent_value(obj.get(key))
+            if not isinstance(obj.get(key), str) or value is None:
+                errors.append(f"objects[{i}].{key} must be a percentage string like \"12.5%\"")
+            elif key in POSITION_KEYS and not 0 <= value <= 100:
+                errors.append(f"objects[{i}].{key} must be between 0% and 100%")
+            elif key not in POSITION_KEYS and not 0 < value <= MAX_SIZE_PERCENT:
+                errors.append(f"objects[{i}].{key} must be between 0% and {MAX_SIZE_PERCENT}%")
+        if 'top' in obj:
+            value = percent_value(obj['top'])
+            if not isinstance(obj['top'], str) or value is None or not 0 <= value <= 100:
+                errors.append(f"objects[{i}].top must be a percentage string between 0% and 100%")
+        for key in STRING_KEYS & set(obj):
+            if not isinstance(obj[key], str):
+                errors.append(f"objects[{i}].{key} must be a string")
+        if obj['type'] == 'text':
+            font_size = obj.get('fontSize')
+            if isinstance(font_size, bool) or not isinstance(font_size, (int, float)) or not MIN_FONT_SIZE <= font_size <= MAX_FONT_SIZE:
+                errors.append(f"objects[{i}].fontSize must be a number between {MIN_FONT_SIZE} and {MAX_FONT_SIZE}")
+            font_sizes.append(font_size)
+        else:
+            image_count += 1
+    if image_count != num_images:
+        errors.append(f"expected {num_images} image objects, got {image_count}")
+    # apply_design_choices puts the main text in the larger text object and the secondary text in the smaller one
+    if len(font_sizes) != 2:
+        errors.append(f"expected 2 text objects (main and secondary text), got {len(font_sizes)}")
+    elif font_sizes[0] == font_sizes[1]:
+        errors.append("the 2 text objects need different fontSize values; the larger one holds the main text")
+    return errors
+
+
+def repair_template(template, resolution, num_images):
+    """
+    Fixes the mistakes LLM output commonly has without another model call: numbers instead of
+    percentage strings, out-of-range positions, string font sizes, missing or unknown keys and
+    surplus image or text objects. Returns a new template; validate it again before use.
+    """
+    if not isinstance(template, dict) or not isinstance(template.get('objects'), list):
+        return template
+    objects = []
+    images = texts = 0
+    for obj in template['objects']:
+        if not isinstance(obj, dict):
+            continue
+        obj_type = str(obj.get('type', '')).lower()
+        if obj_type not in ALLOWED_KEYS:
+            continue
+        if obj_type == 'image':
+            if images == num_images:
+                continue
+            images += 1
+        elif obj_type == 'text':
+            if texts == 2:
+                continue
+            texts += 1
+        repaired = {"type": obj_type}
+        for key in ("top", *GEOMETRY_KEYS):
+            value = percent_value(obj.get(key))
+            if value is None:
+                if key != "top" and key in obj:
+                    repaired[key] = obj[key]
+                continue
+            if key in POSITION_KEYS:
+                value = min(100.0, max(0.0, value))
+            repaired[key] = f"{value:g}%"
+        defaults = TEXT_DEFAULTS if obj_type == 'text' else IMAGE_DEFAULTS
+        for key, default in defaults.items():
+            value = obj.get(key, default)
+            if key == 'fontWeight' and isinstance(value, (int, float)) and not isinstance(value, bool):
+                # CSS numeric weights, e.g. 700
+                value = 'bold' if value >= 600 else 'normal'
+            elif isinstance(default, str) and not isinstance(value, str):
+                value = str(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else default
+            repaired[key] = value
+        if obj_type == 'text':
+            font_size = percent_value(repaired['fontSize'])
+            if font_size is None and isinstance(repaired['fontSize'], str):
+                # e.g. "30px"
+                match = LEADING_NUMBER.match(repaired['fontSize'])
+                font_size = float(match.group()) if match else None
+            repaired['fontSize'] = round(min(MAX_FONT_SIZE, max(MIN_FONT_SIZE, font_size))) if font_size else TEXT_DEFAULTS['fontSize']
+        objects.append(repaired)
+    return {"resolution": resolution, "num_images": num_images, "objects": objects}
+
+
+def loads_lenient(text):
+    """
+    json.loads for model output: strips Markdown fences and text around the outermost JSON
+    object, and drops trailing commas. Raises json.JSONDecodeError if it still can't parse.
+    """
+    clean_text = text.replace('```json', '').replace('```', '').strip()
+    try:
+        return json.loads(clean_text)
+    except json.JSONDecodeError:
+        start, end = clean_text.find('{'), clean_text.rfind('}')
+        if start == -1 or end <= start:
+            raise
+        return json.loads(TRAILING_COMMA.sub(r"\1", clean_text[start:end + 1]))
@@ -0,0 +1,89 @@
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+from template_model import Template
+
+
+class TemplateStore:
+    """
+    Bounded LRU store for generated layout Templates keyed by (resolution, num_images).
+    When `path` is set, entries are appended to a JSON-lines file and reloaded on startup,
+    so layouts generated by Gemini survive restarts.
+    """
+
+    def __init__(self, max_entries=256, path=None):
+        self.max_entries = max_entries
+        self.path = path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if self.path:
+            self._load()
+
+    @staticmethod
+    def key(resolution, num_images):
+        return f"{resolution}|{num_images}"
+
+    def get(self, resolution, num_images):
+        key = self.key(resolution, num_images)
+        with self._lock:
+            template = self._entries.get(key)
+            if template is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return template
+
+    def put(self, resolution, num_images, template):
+        key = self.key(resolution, num_images)
+        with self._lock:
+            self._entries[key] = template
+            self._entries.move_to_end(key)
+            self._evict()
+            if self.path:
+                self._append(key, template)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _append(self, key, template):
+        try:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"key": key, "template": template.to_dict()}) + "\n")
+        except OSError as e:
+            logging.error(f"Could not persist template {key}: {str(e)}")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        lines = 0
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                lines += 1
+                try:
+                    record = json.loads(line)
+                    self._entries[record["key"]] = Template.from_dict(record["template"])
+                    self._entries.move_to_end(record["key"])
+                except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+                    logging.warning(f"Skipping malformed line {lines} in {self.path}")
+        self._evict()
+        # Rewrite the file when it holds mostly overwritten or evicted entries
+        if lines > 2 * max(len(self._entries), 1):
+            self._compact()
+        logging.info(f"Loaded {len(self._entries)} cached templates from {self.path}")
+
+    def _compact(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for key, template in self._entries.items():
+                f.write(json.dumps({"key": key, "template": template.to_dict()}) + "\n")
+        os.replace(tmp_path, self.path)
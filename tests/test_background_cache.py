@@ -0,0 +1,75 @@
+import os
+
+import pytest
+
+import app
+from background_cache import BackgroundCache
+
+PROMPT = "abstract background image banner, background theme: beach, background colors: #ff0000"
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return BackgroundCache(str(tmp_path / "cache"), max_bytes=1000)
+
+
+def generated(tmp_path, name, size):
+    path = tmp_path / name
+    path.write_bytes(os.urandom(size))
+    return str(path)
+
+
+def test_put_and_get_return_the_image_bytes(cache, tmp_path):
+    source = generated(tmp_path, "image.webp", 100)
+    data = cache.put("a" * 32, source)
+    assert data == open(source, "rb").read()
+    assert cache.get("a" * 32) == data
+    assert cache.get("b" * 32) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert BackgroundCache(cache.directory).get("a" * 32) == data
+
+
+def test_replacing_an_entry_does_not_count_its_old_file(cache, tmp_path):
+    for _ in range(5):
+        cache.put("a" * 32, generated(tmp_path, "image.webp", 400))
+    cache.put("b" * 32, generated(tmp_path, "other.webp", 400))
+    assert cache._size == 800
+    assert cache.get("a" * 32) is not None and cache.get("b" * 32) is not None
+
+
+def test_least_recently_used_files_are_evicted(cache, tmp_path):
+    cache.put("a" * 32, generated(tmp_path, "a.webp", 400))
+    cache.put("b" * 32, generated(tmp_path, "b.webp", 400))
+    os.utime(cache._index["a" * 32], (1, 1))
+    cache.put("c" * 32, generated(tmp_path, "c.webp", 400))
+    assert cache.get("a" * 32) is None
+    assert cache.get("b" * 32) is not None and cache.get("c" * 32) is not None
+    assert cache._size <= cache.max_bytes
+
+
+def test_file_evicted_between_lookup_and_read_is_a_miss(cache, tmp_path, monkeypatch):
+    cache.put("a" * 32, generated(tmp_path, "image.webp", 100))
+    touch = cache._touch
+
+    def touch_then_evict(key):
+        path = touch(key)
+        os.remove(path)  # a concurrent put evicts it before it is read
+        return path
+
+    monkeypatch.setattr(cache, "_touch", touch_then_evict)
+    assert cache.get("a" * 32) is None
+    assert (cache.hits, cache.misses) == (0, 1)
+
+
+def test_flux_failure_falls_back_to_another_cached_seed(cache, tmp_path, monkeypatch):
+    seeds = cache.seed_pool(PROMPT, 400, 200, app.FLUX_INFERENCE_STEPS)
+    data = cache.put(cache.key(PROMPT, 400, 200, app.FLUX_INFERENCE_STEPS, seeds[2]), generated(tmp_path, "image.webp", 100))
+
+    def flux_down(*args, **kwargs):
+        raise RuntimeError("flux down")
+
+    monkeypatch.setattr(app, "background_cache", cache)
+    monkeypatch.setattr(app, "call_backend", flux_down)
+    assert app.generate_background("beach", ["#ff0000"], 400, 200, seed=seeds[0]) == (data, seeds[2])
+    # the fallback lookup isn't counted as a hit
+    assert (cache.hits, cache.misses) == (0, 1)
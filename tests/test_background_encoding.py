@@ -0,0 +1,37 @@
+import io
+import os
+import subprocess
+import sys
+
+import pytest
+from PIL import Image
+
+import app
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def background(image_format="PNG"):
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 32), "#336699").save(buffer, format=image_format)
+    return app.open_background(buffer.getvalue())
+
+
+def test_original_keeps_the_bytes_and_their_mime_type():
+    image_bytes, image = background("WEBP")
+    assert app.encode_background(image_bytes, image, "original") == (image_bytes, "image/webp")
+
+
+@pytest.mark.parametrize("image_format, mime_type", [("webp", "image/webp"), ("jpg", "image/jpeg"), ("png", "image/png")])
+def test_other_formats_are_re_encoded(image_format, mime_type):
+    image_bytes, image = background("WEBP" if image_format == "png" else "PNG")
+    payload, encoded_type = app.encode_background(image_bytes, image, image_format, quality=80)
+    assert encoded_type == mime_type
+    assert Image.open(io.BytesIO(payload)).size == (64, 32)
+
+
+def test_unknown_background_format_fails_at_startup():
+    env = {**os.environ, "BACKGROUND_FORMAT": "tiff"}
+    result = subprocess.run([sys.executable, "-c", "import app"], cwd=ROOT, env=env, capture_output=True, text=True)
+    assert result.returncode != 0
+    assert "BACKGROUND_FORMAT must be one of original, webp, jpeg, png, got 'tiff'" in result.stderr
@@ -0,0 +1,60 @@
+import pytest
+
+import app
+from blob_store import FileBlobStore, MemoryBlobStore, asset_id_for, is_valid_asset_id
+
+
+@pytest.fixture(params=["memory", "file"])
+def store(request, tmp_path):
+    return MemoryBlobStore() if request.param == "memory" else FileBlobStore(str(tmp_path))
+
+
+def test_blobs_are_content_addressed(store):
+    asset_id = store.put(b"png bytes", "image/png")
+    assert asset_id == asset_id_for(b"png bytes", "image/png")
+    assert asset_id.endswith(".png") and is_valid_asset_id(asset_id)
+    assert store.put(b"png bytes", "image/png") == asset_id
+    assert store.get(asset_id) == b"png bytes"
+    assert store.get(asset_id_for(b"other", "image/png")) is None
+
+
+def test_memory_store_evicts_least_recently_used():
+    store = MemoryBlobStore(max_bytes=10)
+    first = store.put(b"aaaa", "image/png")
+    second = store.put(b"bbbb", "image/png")
+    store.get(first)
+    store.put(b"cccc", "image/png")
+    assert store.get(second) is None
+    assert store.get(first) == b"aaaa"
+
+
+def test_file_store_rejects_ids_outside_its_directory(tmp_path):
+    store = FileBlobStore(str(tmp_path / "assets"))
+    (tmp_path / "secret").write_bytes(b"secret")
+    assert store.get("../secret") is None
+
+
+def test_assets_are_served_with_a_strong_etag_and_304(monkeypatch):
+    monkeypatch.setattr(app, "blob_store", MemoryBlobStore())
+    asset_id = app.blob_store.put(b"jpeg bytes", "image/jpeg")
+    client = app.app.test_client()
+
+    response = client.get(f"/assets/{asset_id}")
+    assert response.status_code == 200
+    assert response.data == b"jpeg bytes"
+    assert response.mimetype == "image/jpeg"
+    etag = response.headers["ETag"]
+    assert etag == f'"{asset_id.split(".")[0]}"'
+    assert "immutable" in response.headers["Cache-Control"]
+
+    revalidated = client.get(f"/assets/{asset_id}", headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.data == b""
+    assert client.get(f"/assets/{asset_id}", headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_unknown_or_malformed_asset_ids_are_404(monkeypatch):
+    monkeypatch.setattr(app, "blob_store", MemoryBlobStore())
+    client = app.app.test_client()
+    assert client.get(f"/assets/{asset_id_for(b'x', 'image/png')}").status_code == 404
+    assert client.get("/assets/not-an-id").status_code == 404
@@ -0,0 +1,91 @@
+import threading
+import time
+
+import pytest
+
+from clients import ClientProvider, ClientUnavailable
+
+
+def test_slow_client_does_not_block_the_others():
+    provider = ClientProvider()
+    started, release = threading.Event(), threading.Event()
+
+    def slow_flux():
+        started.set()
+        release.wait()
+        return "flux"
+
+    provider.register("flux", slow_flux)
+    provider.register("gemini", lambda: "gemini")
+    thread = threading.Thread(target=provider.get, args=("flux",))
+    thread.start()
+    try:
+        assert started.wait(2)
+        start = time.monotonic()
+        assert provider.get("gemini") == "gemini"
+        assert time.monotonic() - start < 0.5
+    finally:
+        release.set()
+        thread.join()
+    assert provider.status() == {"flux": "ready", "gemini": "ready"}
+
+
+def test_concurrent_first_use_initializes_once():
+    provider = ClientProvider()
+    calls = []
+
+    def factory():
+        calls.append(1)
+        time.sleep(0.05)
+        return object()
+
+    provider.register("flux", factory)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(provider.get("flux"))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+
+
+def test_failed_initialization_is_retried_after_a_growing_delay():
+    provider = ClientProvider(retry_after=0.05, max_retry_after=0.1)
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise RuntimeError("no token")
+        return "flux"
+
+    provider.register("flux", flaky)
+    with pytest.raises(RuntimeError):
+        provider.get("flux")
+    assert provider.status() == {"flux": "error: no token"}
+    with pytest.raises(ClientUnavailable):
+        provider.get("flux")
+    assert len(calls) == 1
+
+    time.sleep(0.06)
+    with pytest.raises(RuntimeError):
+        provider.get("flux")
+    time.sleep(0.06)
+    # the second delay doubled to 0.1s
+    with pytest.raises(ClientUnavailable):
+        provider.get("flux")
+    time.sleep(0.1)
+    assert provider.get("flux") == "flux"
+    assert len(calls) == 3
+    assert provider.status() == {"flux": "ready"}
+
+
+def test_override_clears_a_failure():
+    provider = ClientProvider(retry_after=60)
+    provider.register("gemini", lambda: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        provider.get("gemini")
+    provider.override("gemini", "stand-in")
+    assert provider.get("gemini") == "stand-in"
+    assert provider.status() == {"gemini": "ready"}
@@ -0,0 +1,64 @@
+import threading
+import time
+
+import pytest
+
+import app
+from jobs import JobQueue, QueueFullError
+
+
+def test_job_queue_rejects_when_full_and_prunes_finished_jobs():
+    queue = JobQueue(max_workers=1, max_pending=1, result_ttl=0.05)
+    release = threading.Event()
+    job = queue.submit(lambda timings: release.wait() and "done")
+    with pytest.raises(QueueFullError):
+        queue.submit(lambda timings: None)
+    release.set()
+    assert job.done.wait(2)
+    assert queue.get(job.id).result == "done"
+    assert queue.pending == 0
+    time.sleep(0.06)
+    assert queue.get(job.id) is None
+
+
+def test_failed_job_reports_its_error():
+    queue = JobQueue(max_workers=1)
+
+    def broken(timings):
+        raise RuntimeError("flux down")
+
+    job = queue.submit(broken)
+    assert job.done.wait(2)
+    data = job.to_dict()
+    assert (data["status"], data["error"]) == ("failed", "flux down")
+    assert "result" not in data
+    assert queue.pending == 0
+
+
+def test_async_endpoint_answers_429_when_the_queue_is_full(monkeypatch):
+    queue = JobQueue(max_workers=1, max_pending=1)
+    release = threading.Event()
+    queue.submit(lambda timings: release.wait())
+    monkeypatch.setattr(app, "job_queue", queue)
+    try:
+        response = app.app.test_client().post("/generate_banner?async=1", json={
+            "promotion": "Sale", "theme": "summer", "resolution": "1360x800",
+            "color_palette": ["#ff0000"], "images": [],
+        })
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "5"
+    finally:
+        release.set()
+
+
+def test_job_endpoint_polls_a_job_until_done_and_404s_unknown_ids(monkeypatch):
+    queue = JobQueue(max_workers=1)
+    monkeypatch.setattr(app, "job_queue", queue)
+    client = app.app.test_client()
+    job = queue.submit(lambda timings: {"banner": 1})
+    assert job.done.wait(2)
+    response = client.get(f"/jobs/{job.id}")
+    assert response.status_code == 200
+    assert response.get_json()["result"] == {"banner": 1}
+    assert "Server-Timing" in response.headers
+    assert client.get("/jobs/unknown").status_code == 404
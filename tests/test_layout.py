@@ -0,0 +1,45 @@
+import pytest
+
+from layout import solve_layout
+
+SIZES = ["1360x800", "800x800", "300x600", "728x90", "320x50", "1200x300"]
+PRODUCTS = [(800, 600), (600, 800), (500, 500), (1200, 400), (400, 1200), (640, 480), (480, 640), (700, 700)]
+
+
+def boxes(template):
+    """(left, top, right, bottom) in pixels, computed the way templates/index.html places objects."""
+    result = []
+    for obj, natural in zip(template.objects, [None, None] + PRODUCTS):
+        if obj.type == "text":
+            width, height = obj.width * template.width / 100, obj.font_size
+        else:
+            width, height = natural[0] * obj.width / 100, natural[1] * obj.height / 100
+        left = obj.left * template.width / 100
+        top = template.height - obj.bottom * template.height / 100 - height
+        result.append((left, top, left + width, top + height))
+    return result
+
+
+def overlaps(a, b, tolerance=0.5):
+    return a[0] < b[2] - tolerance and b[0] < a[2] - tolerance and a[1] < b[3] - tolerance and b[1] < a[3] - tolerance
+
+
+@pytest.mark.parametrize("resolution", SIZES)
+@pytest.mark.parametrize("num_images", range(9))
+def test_objects_stay_on_the_canvas_without_overlapping(resolution, num_images):
+    width, height = map(int, resolution.split("x"))
+    template = solve_layout(width, height, PRODUCTS[:num_images])
+    assert (template.width, template.height, template.num_images) == (width, height, num_images)
+    assert len(template.objects) == 2 + num_images
+    placed = boxes(template)
+    for left, top, right, bottom in placed:
+        assert left >= -0.5 and top >= -0.5 and right <= width + 0.5 and bottom <= height + 0.5, (left, top, right, bottom)
+    for i, box in enumerate(placed):
+        for other in placed[i + 1:]:
+            assert not overlaps(box, other), (box, other)
+
+
+def test_main_text_is_larger_than_the_secondary_text():
+    secondary, main = solve_layout(728, 90, PRODUCTS[:6]).objects[:2]
+    assert main.font_size > secondary.font_size
+    assert main.text == secondary.text == ""
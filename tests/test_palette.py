@@ -0,0 +1,55 @@
+import pytest
+from PIL import Image
+
+from palette import (analysis_image, choose_text_color, contrast_ratio, extract_palette, hex_to_rgb,
+                     region_luminance, relative_luminance, required_contrast)
+
+
+def ratio(color_a, color_b):
+    return float(contrast_ratio(relative_luminance(hex_to_rgb(color_a)), relative_luminance(hex_to_rgb(color_b))))
+
+
+def test_contrast_ratio_matches_wcag_reference_values():
+    assert ratio("#ffffff", "#000000") == pytest.approx(21.0, rel=1e-3)
+    assert ratio("#777777", "#ffffff") == pytest.approx(4.48, abs=0.01)
+    assert ratio("#fff", "#ffffff") == pytest.approx(1.0)
+
+
+def test_required_contrast_relaxes_for_large_text():
+    assert required_contrast(16, bold=False) == 4.5
+    assert required_contrast(24, bold=False) == 3.0
+    assert required_contrast(19, bold=True) == 3.0
+    assert required_contrast(18, bold=True) == 4.5
+
+
+@pytest.mark.parametrize("background, suggestion, expected", [("#ffffff", "#eeeeee", "#000000"), ("#101010", "#222222", "#ffffff")])
+def test_low_contrast_suggestion_is_replaced(background, suggestion, expected):
+    luminance = float(relative_luminance(hex_to_rgb(background)))
+    color = choose_text_color([suggestion, "#ffffff", "#000000"], (luminance, luminance), 4.5)
+    assert color == expected
+    assert ratio(color, background) >= 4.5
+
+
+def test_passing_suggestion_is_kept_unless_avoided():
+    white = float(relative_luminance(hex_to_rgb("#ffffff")))
+    assert choose_text_color(["#1a237e", "#000000"], (white, white), 4.5) == "#1a237e"
+    assert choose_text_color(["#1a237e", "#000000"], (white, white), 4.5, avoid="#1a237e") == "#000000"
+
+
+def test_falls_back_to_the_highest_contrast_candidate():
+    gray = float(relative_luminance(hex_to_rgb("#777777")))
+    assert choose_text_color(["#888888", "#000000", "#ffffff"], (gray, gray), 21) == "#000000"
+
+
+def test_region_luminance_and_palette_read_the_pixels_under_the_box():
+    image = Image.new("RGB", (400, 200), "#000000")
+    image.paste(Image.new("RGB", (200, 200), "#ffffff"), (200, 0))
+    small = analysis_image(image)
+    assert max(small.size) <= 256
+    assert region_luminance(small, (0.0, 0.0, 0.4, 1.0)) == (0.0, 0.0)
+    low, high = region_luminance(small, (0.6, 0.0, 1.0, 1.0))
+    assert low == pytest.approx(1.0) and high == pytest.approx(1.0)
+    # the resize blends a few columns at the edge; black and white dominate
+    assert sorted(extract_palette(small)[:2]) == ["#000000", "#ffffff"]
+    # a box off the canvas falls back to the whole image
+    assert region_luminance(small, (2.0, 2.0, 3.0, 3.0)) == (0.0, pytest.approx(1.0))
@@ -0,0 +1,51 @@
+import base64
+import io
+
+import pytest
+from PIL import Image
+
+import app
+from renderer import render_banner
+from template_model import Template
+
+
+def banner(resolution="400x200", font_size=40, text="SALE", src=""):
+    width, height = map(int, resolution.split("x"))
+    objects = [{"type": "text", "left": "5%", "bottom": "40%", "width": "50%", "height": "100%", "fontSize": font_size,
+                "fill": "#000000", "fontWeight": "bold", "text": text, "fontFamily": "Arial"}]
+    if src:
+        objects.append({"type": "image", "left": "60%", "bottom": "10%", "width": "50%", "height": "50%", "src": src})
+    return {"resolution": resolution, "width": width, "height": height, "objects": objects}
+
+
+def png_data_url(size):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, "#ff0000").save(buffer, format="PNG")
+    return "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+def test_renders_the_requested_size_and_format():
+    data = render_banner(Template.from_dict(banner(src=png_data_url((100, 100)))), output_format="webp")
+    image = Image.open(io.BytesIO(data))
+    assert (image.format, image.size) == ("WEBP", (400, 200))
+
+
+def test_font_size_above_the_canvas_height_is_rejected():
+    with pytest.raises(ValueError, match="fontSize must be at most the canvas height"):
+        Template.from_dict(banner(font_size=9000))
+    assert Template.from_dict(banner(font_size=200)).objects[0].font_size == 200
+
+
+@pytest.mark.parametrize("body, message", [
+    ({"template": banner(font_size=9000)}, "fontSize"),
+    ({"template": banner(resolution="40000x40000")}, "Canvas of 40000x40000"),
+    ({"template": banner(font_size=200, text="W" * 5000)}, "Text of 5000 characters"),
+    ({"template": {"resolution": "400x200", "objects": [
+        {"type": "image", "left": "0%", "bottom": "0%", "width": "10000%", "height": "10000%", "src": png_data_url((100, 100))}]}},
+     "Image scaled to 10000x10000"),
+    ({"template": banner(), "format": "bmp"}, "Unsupported output format"),
+])
+def test_render_endpoint_rejects_oversized_or_unsupported_requests_with_400(body, message):
+    response = app.app.test_client().post("/render", json=body)
+    assert response.status_code == 400
+    assert message in response.get_json()["error"]
@@ -0,0 +1,136 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import app
+from resilience import AdaptiveLimiter, Backend, CircuitBreaker, CircuitOpenError, DeadlineExceeded, Overloaded
+
+
+def make_backend(timeout=1, retries=0, hedge_after=0, max_limit=4, max_wait=1, target_latency=10, failure_threshold=5):
+    limiter = AdaptiveLimiter(initial=max_limit, min_limit=1, max_limit=max_limit, target_latency=target_latency, max_wait=max_wait)
+    breaker = CircuitBreaker(failure_threshold=failure_threshold, reset_timeout=0.05)
+    return Backend("test", limiter, breaker, timeout=timeout, retries=retries, backoff=0, hedge_after=hedge_after)
+
+
+def wait_until(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        time.sleep(0.01)
+
+
+def fail():
+    raise RuntimeError("backend down")
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    breaker.record(False)
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_breaker_half_open_trial_reopens_or_closes():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record(False)
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    breaker.record(False)
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.state == "closed"
+    assert breaker.failures == 0
+
+
+def test_backend_rejects_calls_while_circuit_is_open():
+    backend = make_backend(failure_threshold=1)
+    with pytest.raises(RuntimeError):
+        backend.call(fail)
+    calls = []
+    with pytest.raises(CircuitOpenError):
+        backend.call(calls.append, 1)
+    assert calls == []
+
+
+def test_backend_retries_until_success():
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("transient")
+        return "ok"
+
+    assert make_backend(retries=1).call(flaky) == "ok"
+    assert len(attempts) == 2
+
+
+def test_deadline_raises_and_slot_is_released_when_the_call_returns():
+    backend = make_backend(timeout=0.05)
+    release = threading.Event()
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        backend.call(release.wait)
+    assert time.monotonic() - start < 0.5
+    # the abandoned call still holds its slot until it actually returns
+    assert backend.limiter.in_flight == 1
+    release.set()
+    wait_until(lambda: backend.limiter.in_flight == 0)
+    assert backend.breaker.failures == 1
+
+
+def test_slow_call_shrinks_the_limit():
+    backend = make_backend(timeout=1, target_latency=0.01)
+    backend.call(time.sleep, 0.05)
+    wait_until(lambda: backend.limiter.in_flight == 0)
+    assert backend.limiter.limit < 4
+
+
+def test_hedge_returns_the_faster_attempt():
+    started = []
+    lock = threading.Lock()
+
+    def first_slow():
+        with lock:
+            started.append(1)
+            attempt = len(started)
+        if attempt == 1:
+            time.sleep(1)
+            return "slow"
+        return "fast"
+
+    backend = make_backend(timeout=2, hedge_after=0.05)
+    start = time.monotonic()
+    assert backend.call(first_slow) == "fast"
+    assert time.monotonic() - start < 0.5
+    assert len(started) == 2
+
+
+def test_overloaded_fails_fast_without_opening_the_circuit():
+    backend = make_backend(max_limit=1, max_wait=0, failure_threshold=1)
+    release = threading.Event()
+    holder = threading.Thread(target=backend.call, args=(release.wait,))
+    holder.start()
+    wait_until(lambda: backend.limiter.in_flight == 1)
+    with pytest.raises(Overloaded):
+        backend.call(lambda: "never")
+    assert backend.breaker.state == "closed"
+    release.set()
+    holder.join()
+
+
+@pytest.mark.parametrize("text", ["not json", "[1, 2]"])
+def test_unusable_design_response_falls_back_to_the_promotion(monkeypatch, text):
+    monkeypatch.setattr(app, "call_backend", lambda *args: SimpleNamespace(text=text))
+    monkeypatch.setattr(app, "make_vision_thumbnail", lambda image: image)
+    choices = app.request_design_choices(None, "Summer sale", "beach", 400, 200, [], None, [])
+    assert choices == app.fallback_design_choices("Summer sale")
@@ -0,0 +1,87 @@
+import base64
+import io
+import threading
+import time
+
+import app
+from single_flight import SingleFlight
+
+
+def wait_until(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        time.sleep(0.01)
+
+
+def run_concurrently(flight, key, func, count):
+    results, errors = [], []
+
+    def worker():
+        try:
+            results.append(flight.do(key, func))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def test_single_flight_shares_one_result():
+    flight = SingleFlight(result_ttl=10)
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait()
+        return {"banner": 1}
+
+    threads, results, errors = run_concurrently(flight, "key", compute, 5)
+    wait_until(lambda: flight.executed + flight.shared == 5)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+    assert all(result is results[0][0] for result, _ in results)
+    # reused within the TTL
+    assert flight.do("key", compute) == (results[0][0], True)
+    assert len(calls) == 1
+
+
+def test_single_flight_shares_errors_but_does_not_cache_them():
+    flight = SingleFlight(result_ttl=10)
+    release = threading.Event()
+
+    def broken():
+        release.wait()
+        raise RuntimeError("flux down")
+
+    threads, results, errors = run_concurrently(flight, "key", broken, 3)
+    wait_until(lambda: flight.executed + flight.shared == 3)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert results == []
+    assert len(errors) == 3 and all(str(e) == "flux down" for e in errors)
+    assert flight.do("key", lambda: "recovered") == ("recovered", False)
+
+
+def test_single_flight_result_expires_after_ttl():
+    flight = SingleFlight(result_ttl=0.05)
+    assert flight.do("key", lambda: 1) == (1, False)
+    time.sleep(0.06)
+    assert flight.do("key", lambda: 2) == (2, False)
+
+
+def test_request_key_ignores_formatting_but_not_image_contents():
+    png = b"\x89PNG fake image bytes"
+    encoded = base64.b64encode(png).decode()
+    key = app.request_key("banner", "Summer  sale", "Beach", "1360x800", ["#FF0000 "], [f"data:image/png;base64,{encoded}"])
+    assert key == app.request_key("banner", "Summer sale", " beach ", "1360x800", ["#ff0000"], [io.BytesIO(png)])
+    assert key != app.request_key("banner", "Summer sale", "beach", "1360x800", ["#ff0000"], [b"other bytes"])
+    assert key != app.request_key("banners", "Summer sale", "beach", "1360x800", ["#ff0000"], [png])
@@ -0,0 +1,104 @@
+import json
+
+import pytest
+
+import app
+from template_model import ImageObject, Template, TextObject
+
+FABRIC_TEMPLATE = {
+    "resolution": "1360x800",
+    "num_images": 1,
+    "objects": [
+        {"type": "text", "left": "7.86%", "bottom": "49.62%", "width": "48%", "height": "100%", "fontSize": 48, "fill": "",
+         "fontWeight": "bold", "fontStyle": "", "textAlign": "left", "text": "", "fontFamily": "Gill Sans MT"},
+        {"type": "text", "left": "7.44%", "bottom": "36.78%", "width": "48%", "height": "100%", "fontSize": 64, "fill": "",
+         "fontWeight": "bold", "fontStyle": "normal", "textAlign": "left", "text": "", "fontFamily": "Arial Black"},
+        {"type": "image", "left": "62%", "bottom": "7%", "width": "70%", "height": "70%", "src": ""},
+    ],
+}
+
+
+def test_round_trip_keeps_the_fabric_schema():
+    template = Template.from_dict(FABRIC_TEMPLATE)
+    assert (template.width, template.height, template.num_images) == (1360, 800, 1)
+    assert template.objects[0].left == 7.86
+    data = template.to_dict()
+    assert data["objects"] == FABRIC_TEMPLATE["objects"]
+    assert Template.from_dict(data) == template
+
+
+def test_missing_fields_get_defaults_and_unknown_keys_are_dropped():
+    template = Template.from_dict({"resolution": "100x50", "objects": [
+        {"type": "text", "left": "10%", "bottom": "20%", "scaleX": 2},
+        {"type": "image", "left": 0, "top": "0%", "src": "x"},
+    ]})
+    text, image = template.objects
+    assert isinstance(text, TextObject) and text.font_size == 20 and text.font_family == "Arial"
+    assert "scaleX" not in text.to_dict()
+    assert isinstance(image, ImageObject) and image.top == 0 and image.bottom is None
+    assert "bottom" not in image.to_dict() and image.to_dict()["top"] == "0%"
+    assert template.num_images == 1
+
+
+@pytest.mark.parametrize("objects, message", [
+    ([{"type": "circle"}], "objects[0] must be an object"),
+    ([{"type": "text", "left": "abc"}], "objects[0].left must be a percentage"),
+    ([{"type": "text", "fontSize": 0}], "objects[0].fontSize must be a positive number"),
+    ([{"type": "text", "fontWeight": 700}], "objects[0].fontWeight must be a string"),
+    ([{"type": "image", "top": "auto"}], "objects[0].top must be a percentage"),
+])
+def test_malformed_templates_raise_value_error(objects, message):
+    with pytest.raises(ValueError, match=message.replace("[", r"\[").replace("]", r"\]")):
+        Template.from_dict({"resolution": "100x50", "objects": objects})
+
+
+def test_changes_copy_instead_of_mutating_the_shared_template():
+    template = Template.from_dict(FABRIC_TEMPLATE)
+    rounded = template.rounded()
+    assert rounded.objects[0].left == 8 and template.objects[0].left == 7.86
+    scaled = template.scaled("680x400", 0.5)
+    assert scaled.objects[1].font_size == 32 and scaled.objects[2].width == 35
+    assert (scaled.width, scaled.height) == (680, 400)
+    assert template.objects[1].font_size == 64
+
+
+def gemini_returning(*texts):
+    responses = iter(texts)
+
+    class Response:
+        def __init__(self, text):
+            self.text = text
+            self.usage_metadata = None
+
+    return lambda *args, **kwargs: Response(next(responses))
+
+
+def generated(objects):
+    return json.dumps({"resolution": "900x600", "num_images": 1, "objects": objects})
+
+
+def test_gemini_template_with_bad_field_types_is_repaired(monkeypatch):
+    objects = [dict(obj) for obj in FABRIC_TEMPLATE["objects"]]
+    objects[0]["fontWeight"] = 700
+    objects[2]["top"] = "auto"
+    monkeypatch.setattr(app, "gemini_generate", gemini_returning(generated(objects)))
+    template = app.generate_template_with_gemini("900x600", 1)
+    assert template.resolution == "900x600"
+    assert template.objects[0].font_weight == "bold"
+    assert template.objects[2].top is None
+
+
+def test_unusable_gemini_template_falls_back_to_the_solver(monkeypatch):
+    monkeypatch.setattr(app, "gemini_generate", gemini_returning("not json", "still not json"))
+    assert app.generate_template_with_gemini("900x600", 1) is None
+    # prepare_template then solves the layout locally
+    assert app.prepare_template(None, "900x600", [(400, 300)]).num_images == 1
+
+
+def test_template_the_model_cannot_parse_falls_back_instead_of_failing(monkeypatch):
+    objects = [dict(obj) for obj in FABRIC_TEMPLATE["objects"]]
+    objects[0]["fontWeight"] = 700
+    monkeypatch.setattr(app, "gemini_generate", gemini_returning(generated(objects)))
+    # a validation gap must not fail the request
+    monkeypatch.setattr(app, "template_errors", lambda template, num_images: [])
+    assert app.generate_template_with_gemini("900x600", 1) is None
@@ -0,0 +1,44 @@
+from template_model import ImageObject, Template, TextObject
+from template_registry import TemplateRegistry
+
+
+def make_template(resolution, num_images=1, font_size=40):
+    width, height = map(int, resolution.split("x"))
+    text = TextObject(10.0, 50.0, None, 48.0, 100.0, font_size, "", "bold", "normal", "left", "", "Arial")
+    image = ImageObject(60.0, 10.0, None, 50.0, 50.0, "")
+    return Template(resolution, width, height, num_images, (text,) + (image,) * num_images)
+
+
+def test_exact_returns_a_template_for_the_key_only():
+    template = make_template("1360x800")
+    registry = TemplateRegistry([template, make_template("1360x800", num_images=2)])
+    assert registry.exact("1360x800", 1) is template
+    assert registry.exact("1360x800", 3) is None
+    assert registry.exact("800x800", 1) is None
+
+
+def test_scaled_rescales_the_closest_aspect_ratio():
+    registry = TemplateRegistry([make_template("1360x800"), make_template("800x800")])
+    scaled = registry.scaled("680x400", 1)
+    assert (scaled.resolution, scaled.width, scaled.height) == ("680x400", 680, 400)
+    text, image = scaled.objects
+    assert text.font_size == 20
+    assert (text.left, text.bottom) == (10.0, 50.0)
+    assert (image.width, image.height) == (25.0, 25.0)
+
+
+def test_nearest_prefers_aspect_then_size_and_respects_the_tolerance():
+    small, large = make_template("680x400"), make_template("2720x1600")
+    registry = TemplateRegistry([large, small, make_template("800x800")], aspect_tolerance=0.1)
+    assert registry.nearest("700x410", 1) == (small, min(700 / 680, 410 / 400))
+    assert registry.nearest("800x200", 1) is None
+    assert registry.scaled("800x200", 1) is None
+    assert registry.nearest("680x400", 2) is None
+
+
+def test_nearest_k_ranks_image_count_first():
+    one, two = make_template("1360x800"), make_template("1360x800", num_images=2)
+    square = make_template("800x800", num_images=2)
+    registry = TemplateRegistry([one, square, two])
+    assert registry.nearest_k("1360x800", 2, 2) == [two, square]
+    assert registry.nearest_k("1360x800", 2, 5) == [two, square, one]
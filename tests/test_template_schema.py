@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+from template_schema import loads_lenient, repair_template, template_errors
+
+
+def text(font_size, **extra):
+    return {"type": "text", "left": "5%", "bottom": "50%", "width": "48%", "height": "100%", "fontSize": font_size,
+            "fill": "", "fontWeight": "bold", "fontStyle": "normal", "textAlign": "left", "text": "", "fontFamily": "Arial", **extra}
+
+
+def image(**extra):
+    return {"type": "image", "left": "60%", "bottom": "10%", "width": "70%", "height": "70%", "src": "", **extra}
+
+
+def test_valid_template_has_no_errors():
+    assert template_errors({"objects": [text(48), text(24), image()]}, 1) == []
+
+
+@pytest.mark.parametrize("objects, num_images, message", [
+    ([text(48), text(24)], 1, "expected 1 image objects, got 0"),
+    ([text(48), image()], 1, "expected 2 text objects"),
+    ([text(48), text(48), image()], 1, "different fontSize"),
+    ([text(48), text(24, left=5), image()], 1, "objects[1].left must be a percentage string"),
+    ([text(48), text(24, bottom="120%"), image()], 1, "objects[1].bottom must be between 0% and 100%"),
+    ([text(48), text(24, top=10), image()], 1, "objects[1].top must be a percentage string"),
+    ([text(48), text(24, fontWeight=700), image()], 1, "objects[1].fontWeight must be a string"),
+    ([text(48), text(2), image()], 1, "objects[1].fontSize must be a number between"),
+    ([text(48), text(24, shadow="x"), image()], 1, "objects[1] has unknown keys ['shadow']"),
+    ([text(48), text(24), {"type": "rect"}], 0, "objects[2] must be an object with type"),
+])
+def test_schema_violations_are_reported(objects, num_images, message):
+    errors = template_errors({"objects": objects}, num_images)
+    assert any(message in error for error in errors), errors
+
+
+def test_repair_fixes_common_model_mistakes():
+    broken = {"objects": [
+        text("30px", left=5, bottom=-10, fontWeight=700, fill=None, shadow="x"),
+        text(900, top="high"),
+        text(12),
+        image(),
+        image(),
+        "junk",
+    ]}
+    repaired = repair_template(broken, "1360x800", 1)
+    assert template_errors(repaired, 1) == []
+    main, secondary, picture = repaired["objects"]
+    assert (main["fontSize"], main["left"], main["bottom"]) == (30, "5%", "0%")
+    assert (main["fontWeight"], main["fill"]) == ("bold", "")
+    assert "shadow" not in main
+    assert secondary["fontSize"] == 400
+    assert "top" not in secondary
+    assert picture["type"] == "image"
+    assert (repaired["resolution"], repaired["num_images"]) == ("1360x800", 1)
+
+
+def test_loads_lenient_strips_fences_prose_and_trailing_commas():
+    assert loads_lenient('```json\n{"a": 1}\n```') == {"a": 1}
+    assert loads_lenient('Here you go: {"a": [1, 2,],} Enjoy!') == {"a": [1, 2]}
+    with pytest.raises(json.JSONDecodeError):
+        loads_lenient("no json here")
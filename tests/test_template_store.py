@@ -0,0 +1,44 @@
+import json
+
+from template_model import Template, TextObject
+from template_store import TemplateStore
+
+
+def make_template(resolution="1360x800", font_size=40):
+    width, height = map(int, resolution.split("x"))
+    text = TextObject(10.0, 50.0, None, 48.0, 100.0, font_size, "", "bold", "normal", "left", "", "Arial")
+    return Template(resolution, width, height, 0, (text,))
+
+
+def test_round_trip_through_the_file(tmp_path):
+    path = str(tmp_path / "templates.jsonl")
+    store = TemplateStore(path=path)
+    store.put("1360x800", 0, make_template(font_size=40))
+    store.put("1360x800", 0, make_template(font_size=48))
+    store.put("800x800", 0, make_template("800x800"))
+
+    reloaded = TemplateStore(path=path)
+    assert len(reloaded) == 2
+    assert reloaded.get("1360x800", 0) == make_template(font_size=48)
+    assert reloaded.get("800x800", 0) == make_template("800x800")
+    assert reloaded.get("728x90", 0) is None
+    assert (reloaded.hits, reloaded.misses) == (2, 1)
+
+
+def test_lru_eviction_keeps_recently_used_entries():
+    store = TemplateStore(max_entries=2)
+    store.put("a", 0, make_template())
+    store.put("b", 0, make_template())
+    store.get("a", 0)
+    store.put("c", 0, make_template())
+    assert store.get("b", 0) is None
+    assert store.get("a", 0) is not None and store.get("c", 0) is not None
+
+
+def test_malformed_lines_are_skipped(tmp_path):
+    path = tmp_path / "templates.jsonl"
+    good = json.dumps({"key": "1360x800|0", "template": make_template().to_dict()})
+    path.write_text("\n".join(["not json", "[1, 2]", "42", '"text"', '{"key": "x"}', '{"key": "y", "template": {}}', good]) + "\n")
+    store = TemplateStore(path=str(path))
+    assert len(store) == 1
+    assert store.get("1360x800", 0) == make_template()
@@ -0,0 +1,63 @@
+import io
+
+import pytest
+
+import app
+from template_model import Template
+
+FIELDS = {"promotion": "Summer sale", "theme": "beach", "resolution": "400x200", "color_palette": "#ffffff,#000000", "background_mode": "local"}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # keep the stages that would call the model backends local
+    monkeypatch.setattr(app, "coalescer", None)
+    monkeypatch.setattr(app, "select_template", lambda resolution, num_images: Template(resolution, 400, 200, num_images, ()))
+    monkeypatch.setattr(app, "make_background", lambda *args: (b"", None))
+    return app.app.test_client()
+
+
+def upload(client, *files, **fields):
+    data = {**FIELDS, **fields, "images": [(io.BytesIO(content), name) for name, content in files]}
+    return client.post("/generate_banner/upload", data=data, content_type="multipart/form-data")
+
+
+def test_file_over_the_per_file_limit_is_413(client, monkeypatch):
+    monkeypatch.setattr(app.UploadRequest, "max_file_bytes", 1024)
+    response = upload(client, ("big.png", b"x" * 4096))
+    assert response.status_code == 413
+
+
+def test_request_over_the_total_limit_is_413(client, monkeypatch):
+    monkeypatch.setattr(app.UploadRequest, "max_upload_bytes", 1024)
+    response = upload(client, ("a.png", b"x" * 800), ("b.png", b"x" * 800))
+    assert response.status_code == 413
+    assert "at most 1024 bytes" in response.get_json()["error"]
+
+
+def test_missing_field_and_bad_resolution_are_400(client):
+    response = client.post("/generate_banner/upload", data={"theme": "beach"}, content_type="multipart/form-data")
+    assert response.status_code == 400
+    assert upload(client, ("a.png", b"x"), resolution="400").status_code == 400
+    assert upload(client, ("a.png", b"x"), resolution="100000x100000").status_code == 400
+
+
+def test_image_that_is_not_an_image_is_400(client):
+    response = upload(client, ("a.png", b"not an image"))
+    assert response.status_code == 400
+    assert "Unsupported image" in response.get_json()["error"]
+
+
+def test_invalid_base64_image_is_400(client):
+    data = {**FIELDS, "color_palette": ["#ffffff"], "images": ["data:image/png;base64,abc"]}
+    response = client.post("/generate_banner", json=data)
+    assert response.status_code == 400
+
+
+def test_failures_past_the_input_checks_are_500(client, monkeypatch):
+    def generate(*args, **kwargs):
+        raise ValueError("Invalid JSON response from Gemini API")
+
+    monkeypatch.setattr(app, "generate_banner_coalesced", generate)
+    data = {**FIELDS, "color_palette": ["#ffffff"], "images": []}
+    assert client.post("/generate_banner", json=data).status_code == 500
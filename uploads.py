@@ -0,0 +1,45 @@
+from tempfile import SpooledTemporaryFile
+
+from flask import Request
+from werkzeug.exceptions import RequestEntityTooLarge
+
+# Uploaded files stay in memory up to this size and are spilled to a temp file beyond it
+SPOOL_MAX_MEMORY = 256 * 1024
+
+
+class LimitedSpooledFile(SpooledTemporaryFile):
+    """
+    Spooled temp file for one uploaded file that raises 413 once the file, or all files of the
+    request together, grow past their limits, so an oversized upload is never read to the end.
+    """
+
+    def __init__(self, request, max_file_bytes):
+        super().__init__(max_size=SPOOL_MAX_MEMORY, mode="w+b")
+        self._request = request
+        self._max_file_bytes = max_file_bytes
+        self._written = 0
+
+    def write(self, data):
+        self._written += len(data)
+        self._request.upload_bytes += len(data)
+        if self._max_file_bytes and self._written > self._max_file_bytes:
+            raise RequestEntityTooLarge(f"Each file may be at most {self._max_file_bytes} bytes")
+        if self._request.max_upload_bytes and self._request.upload_bytes > self._request.max_upload_bytes:
+            raise RequestEntityTooLarge(f"Uploads may be at most {self._request.max_upload_bytes} bytes in total")
+        return super().write(data)
+
+
+class UploadRequest(Request):
+    """
+    Request class that streams multipart file parts into LimitedSpooledFile instead of
+    Werkzeug's default spooled files. Limits of 0 disable the check.
+    """
+    max_file_bytes = 0
+    max_upload_bytes = 0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.upload_bytes = 0
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return LimitedSpooledFile(self, self.max_file_bytes)